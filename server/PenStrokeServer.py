@@ -13,11 +13,13 @@ import httplib
 import socket
 from xml.dom.minidom import Document, parseString
 import cPickle
-from symbol_classifier import SymbolClassifier
+from symbol_classifier import SymbolClassifier, IncrementalSymbolRecognizer
 
 classifier_filename = "best_full2013_SVMRBF_new.dat"
 
 classifier = ''
+#keeps the pre-processed strokes of the last symbol (usually the one being written)
+recognizer = None
 
 class RecognitionServer(SimpleHTTPServer.SimpleHTTPRequestHandler):
     instance_id = 0
@@ -51,7 +53,7 @@ class RecognitionServer(SimpleHTTPServer.SimpleHTTPRequestHandler):
             classifierPoints.append(tempPoints)
     
         print classifierPoints 
-        results = classifier.classify_points_prob(classifierPoints, 30)
+        results = recognizer.classify_points_prob(classifierPoints, 30)
           
         doc = Document()
         root = doc.createElement("RecognitionResults")
@@ -103,6 +105,7 @@ if __name__ == "__main__":
     if not isinstance(classifier, SymbolClassifier):
         print("Invalid classifier file!")
         #return
+    recognizer = IncrementalSymbolRecognizer(classifier)
     print "Reading symbol code from generic_symbol_table.csv"
     dict = {}
     with open('generic_symbol_table.csv', 'rt') as csvfile2:
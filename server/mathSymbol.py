@@ -1,6 +1,14 @@
 import math
+import multiprocessing
+import time
 from traceInfo import *
 
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    #optional, only used for distances in very long symbols
+    cKDTree = None
+
 
 #=====================================================================
 #  This class represents a math symbol. A math symbol is 
@@ -35,7 +43,11 @@ from traceInfo import *
 #
 #=====================================================================
 
-class MathSymbol:
+class MathSymbol(object):
+    #all the attributes of the symbol (no per instance dictionary)
+    __slots__ = ['id', 'traces', 'truth', 'minX', 'maxX', 'minY', 'maxY', 'original_box', 'w_ratio', 'h_ratio',
+                 'point_cloud']
+
     #Define the set of features to use...
     #1, base 8-11, - final
     useTracesNumber = True
@@ -78,6 +90,22 @@ class MathSymbol:
 
     n_bins = 8 #16
 
+    #symbols with more points use a KD-tree (if available) for the min distances grid
+    distance_index_points = 5000
+
+    #attributes that define the layout of the features vector...
+    features_config = ['useCrossings', 'useAngularCrossings', 'useTracesNumber', 'useDistancesGrid',
+                       'useLineFeatures', 'useCDF', 'use2DHistogram', 'useGabor', 'useAspectRatio',
+                       'usePointAngDist', 'useConvexArea', 'useSubsegments', 'useEigenFeatures',
+                       'useSizeRatio', 'number_crossings', 'number_angular', 'number_subcrossings',
+                       'angular_subcrossings', 'distance_grid', 'hist_2d_grid', 'gabor_grid',
+                       'angular_bins', 'angular_dist', 'n_bins']
+    #...and the plan to extract them (built for the last configuration used)
+    feature_plan = None
+
+    #accumulate the cost of each family of features (see features_times)
+    profileFeatures = False
+
     #constructor
     def __init__(self, sym_id, traces, truth):
         self.id = sym_id
@@ -105,6 +133,9 @@ class MathSymbol:
         self.w_ratio = 1.0
         self.h_ratio = 1.0
 
+        #all points and sharp points of the traces (built when required)
+        self.point_cloud = None
+
     #manually set size ratio for this symbol
     def setSizeRatio(self, avg_width, avg_height):
         if avg_width > 0.0:
@@ -145,6 +176,10 @@ class MathSymbol:
             if oMaxY > maxY:
                 maxY = oMaxY
                         
+        return self.getSquaredBox(minX, maxX, minY, maxY)
+
+    #Get a squared box centered on the given box that contains it
+    def getSquaredBox(self, minX, maxX, minY, maxY):
         #the original proportions must be keep, check longest side...
         width = maxX - minX
         height = maxY - minY
@@ -161,772 +196,740 @@ class MathSymbol:
 
     #normalize the symbol
     def normalize(self):
-        #first, get the bounding box of the whole symbol...                                        
-        current_box = self.getSquaredBoundingBox()
+        #first, get the bounding box of the whole symbol (already computed)...
+        current_box = self.getSquaredBox(self.minX, self.maxX, self.minY, self.maxY)
         
-        #relocate and re-scale each trace, to be in the new box [-1, 1],[-1,1]
+        #relocate and re-scale all traces at once, to be in the new box [-1, 1],[-1,1]
         new_box = [-1, 1, -1, 1]
-        
+
+        inputWidth = current_box[1] - current_box[0]
+        inputHeight = current_box[3] - current_box[2]
+        outputWidth = new_box[1] - new_box[0]
+        outputHeight = new_box[3] - new_box[2]
+
+        if inputWidth == 0:
+            current_box[1] = current_box[1] + 0.01
+            current_box[0] = current_box[0] - 0.01
+            inputWidth = 0.02
+
+        if inputHeight == 0:
+            current_box[3] = current_box[3] + 0.01
+            current_box[2] = current_box[2] - 0.01
+            inputHeight = 0.02
+
+        #points of all traces followed by sharp points of all traces...
+        sizes = [ len(trace.points) for trace in self.traces ]
+        sharp_sizes = [ len(trace.sharp_points) for trace in self.traces ]
+        stacked = np.concatenate([ trace.points for trace in self.traces ] +
+                                 [ trace.sharp_points for trace in self.traces ])
+
+        relocated = TraceInfo.relocateArray(stacked, current_box, inputWidth, inputHeight,
+                                            new_box, outputWidth, outputHeight)
+
+        #new bounding boxes of each trace...
+        starts = np.cumsum([0] + sizes[:-1])
+        mins = np.minimum.reduceat(relocated[:sum(sizes)], starts, axis=0).tolist()
+        maxs = np.maximum.reduceat(relocated[:sum(sizes)], starts, axis=0).tolist()
+
+        pos = 0
+        sharp_pos = sum(sizes)
+        for i, trace in enumerate(self.traces):
+            trace.points = relocated[pos:pos + sizes[i]]
+            trace.sharp_points = relocated[sharp_pos:sharp_pos + sharp_sizes[i]]
+            trace.bounding_box = (mins[i][0], maxs[i][0], mins[i][1], maxs[i][1])
+
+            pos += sizes[i]
+            sharp_pos += sharp_sizes[i]
+
+        #...and of the whole symbol
+        self.minX = min([ box[0] for box in mins ])
+        self.maxX = max([ box[0] for box in maxs ])
+        self.minY = min([ box[1] for box in mins ])
+        self.maxY = max([ box[1] for box in maxs ])
+
+        #the relocated arrays already contain all the points and sharp points of the symbol
+        sources = [ (trace.points, trace.sharp_points) for trace in self.traces ]
+        self.point_cloud = (sources, relocated[:sum(sizes)], relocated[sum(sizes):])
+
+    #Gets the points and the sharp points of all the traces (in order) as two arrays.
+    #They are kept while the points of the traces remain the same
+    def getPointCloud(self):
+        cloud = self.point_cloud
+
+        valid = cloud is not None and len(cloud[0]) == len(self.traces)
+        if valid:
+            for (points, sharp_points), trace in zip(cloud[0], self.traces):
+                if points is not trace.points or sharp_points is not trace.sharp_points:
+                    valid = False
+                    break
+
+        if not valid:
+            sources = [ (trace.points, trace.sharp_points) for trace in self.traces ]
+            points = np.concatenate([ trace.points for trace in self.traces ])
+            sharp_points = np.concatenate([ trace.sharp_points for trace in self.traces ])
+
+            cloud = (sources, points, sharp_points)
+            self.point_cloud = cloud
+
+        return cloud[1], cloud[2]
+
+    #Discards the tables of segments of the traces (used for crossings), they are
+    #large compared to the points and are only needed while extracting features
+    def releaseSegmentTables(self):
         for trace in self.traces:
-            trace.relocatePoints(current_box, new_box)        
+            trace.segment_table = None
     
-    #produce the features vector
+    #produce the features vector (using the feature plan of the current configuration)
     def getFeatures(self):
+        return MathSymbol.getFeaturePlan().extract(self).tolist()
+
+    #get a list of the types of the features currently in use
+    def getFeaturesTypes(self):
+        return list(MathSymbol.getFeaturePlan().types)
+
+    #get a list of the names of the features currently in use
+    def getFeaturesNames(self):
+        return list(MathSymbol.getFeaturePlan().names)
+
+    #Gets the values of all the attributes that define the features in use
+    #(as a tuple of (name, value) that can be compared between calls)
+    @staticmethod
+    def getFeaturesConfig():
+        config = []
+        for name in MathSymbol.features_config:
+            value = getattr(MathSymbol, name)
+            if isinstance(value, list):
+                value = tuple(value)
+
+            config.append( (name, value) )
+
+        return tuple(config)
+
+    #Gets the feature plan for the current configuration. The plan is built 
+    #only once, and again only if the configuration changes
+    @staticmethod
+    def getFeaturePlan():
+        config = MathSymbol.getFeaturesConfig()
+
+        if MathSymbol.feature_plan is None or MathSymbol.feature_plan.config != config:
+            MathSymbol.feature_plan = FeaturePlan(config)
+
+        return MathSymbol.feature_plan
+
+    #1) first, crossings...
+    def getCrossingsFeatures(self):
+        #...count how many line segments are crossed by horizontal and vertical lines
+        #   at different heights and widths
+        step = 2.0 / (MathSymbol.number_crossings + 1)
+        substep = step / (MathSymbol.number_subcrossings + 1)
+
+        #positions of all the lines (number_subcrossings per each crossing line)
+        positions = []
+        for i in range(1, MathSymbol.number_crossings + 1):
+            for k in range(1, MathSymbol.number_subcrossings + 1):
+                positions.append( -1 + (i - 0.5) * step + k * substep )
+
+        #horizontal crossings
+        (horizontal_count_crossings, horizontal_avg_crossings, horizontal_min_crossings, 
+         horizontal_max_crossings, horizontal_area_crossings, 
+         horizontal_dist_crossings) = self.getScanlineCrossings(positions, True, substep)
+
+        #vertical crossings
+        (vertical_count_crossings, vertical_avg_crossings, vertical_min_crossings, 
+         vertical_max_crossings, vertical_area_crossings, 
+         vertical_dist_crossings) = self.getScanlineCrossings(positions, False, substep)
+        
         features = []
+        features += horizontal_count_crossings          #add discrete values...
         
-        #1) first, crossings...
-        if MathSymbol.useCrossings:         
-            #...count how many line segments are crossed by horizontal and vertical lines
-            #   at different heights and widths
-            step = 2.0 / (MathSymbol.number_crossings + 1)
-            substep = step / (MathSymbol.number_subcrossings + 1)
-            horizontal_count_crossings = []
-            horizontal_avg_crossings = []
-            horizontal_min_crossings = []
-            horizontal_max_crossings = []
-
-            horizontal_area_crossings = []
-            horizontal_dist_crossings = []
-            
-            vertical_count_crossings = []        
-            vertical_avg_crossings = []
-            vertical_min_crossings = []
-            vertical_max_crossings = []
-
-            vertical_area_crossings = []
-            vertical_dist_crossings = []
-            
-            for i in range(1, MathSymbol.number_crossings + 1):
-                #horizontal crossings                            
-                h_crossings = [0, 0.0, 1.1, -1.1]
-                
-                init = -1 + i * step
-
-                total_crossings = 0
-                avg_x = 0.0
-                avg_min = 0.0
-                avg_max = 0.0
-                area_limits = []
-                cross_positions = ['0'] * 3
-                for k in range(1, MathSymbol.number_subcrossings + 1):
-                    init = -1 + (i - 0.5) * step + k * substep
-                    line = [ (-1.1, init), (1.1, init) ]
-
-                    current_min = 1.1
-                    current_max = -1.1
-                        
-                    for t in self.traces:
-                        current_crossings = t.getLineCrossings(line)
-    
-                        for x, y in current_crossings:
-                            avg_x += x
-                            current_min = min(current_min, x)
-                            current_max = max(current_max, x)
-
-                            #discretize x...[-1,-0.5,0,0.5,1]
-                            #disc_x = int(round((x + 1.0) * 2.0))
-                            #discretize x...[-1,0,1]
-                            disc_x = int(round(x + 1.0))
-                            cross_positions[ disc_x ] = '1'
-                            
-                        total_crossings += float(len(current_crossings))
-
-                    #store limits 
-                    avg_min += current_min 
-                    avg_max += current_max
-
-                    area_limits.append( (current_min, current_max) )
-
-                h_crossings[0] = round((total_crossings * 2.0) / MathSymbol.number_subcrossings) / 2.0
-
-                if total_crossings > 0:
-                    h_crossings[1] = avg_x / total_crossings
-                    h_crossings[2] = avg_min / float(MathSymbol.number_subcrossings)
-                    h_crossings[3] = avg_max / float(MathSymbol.number_subcrossings)
-                     
-                horizontal_count_crossings.append( h_crossings[0] )  #Count Crossings 
-                
-                #discretizing... [-1.0, -0.5, 0.0, 0.5, 1.0]
-                if total_crossings > 0:
-                    avg = ((round((h_crossings[1] + 1.0) * 2.0)) / 2.0) - 1.0
-                    current_min = ((round((h_crossings[2] + 1.0) * 2.0)) / 2.0) - 1.0
-                    current_max = ((round((h_crossings[3] + 1.0) * 2.0)) / 2.0) - 1.0
-                else:
-                    avg = -2.0
-                    current_min = -2.0
-                    current_max = -2.0
-                
-
-                #horizontal_avg_crossings.append( str(avg) )             #Average         (Discrete)
-                horizontal_avg_crossings.append( h_crossings[1] )       #Average         (Continuous)                
-                horizontal_min_crossings.append( h_crossings[2] )       #Min             (Continuous)
-                horizontal_max_crossings.append( h_crossings[3] )       #Max             (Continuous)
-
-                #The stimation of area inside min and max ...
-                total_area = 0.0
-                if len(area_limits) > 0:
-                    for k in range(len(area_limits) - 1):
-                        init_x1, end_x1 = area_limits[k]
-                        init_x2, end_x2 = area_limits[k + 1]
-
-                        if init_x1 <= end_x2 and init_x2 <= end_x1 and init_x1 <= end_x1 and init_x2 <= end_x2:
-                            #common range...
-                            #extract three segments, common and two non-commons
-                            w_common = min(end_x1, end_x2) - max(init_x1, init_x2)
-                            w_left = max(init_x1, init_x2) - min(init_x1, init_x2)
-                            w_right = max(end_x1, end_x2) - min(end_x1, end_x2)
-
-                            total_area += ((w_left + w_right) / 2.0 + w_common) * substep
-
-                horizontal_area_crossings.append( total_area )                        
-                horizontal_dist_crossings.append( str(int(''.join(cross_positions), 2)) )
-            
-                #vertical crossings
-                
-                v_crossings = [0, 0.0, 1.1, -1.1]
-
-                total_crossings = 0
-                avg_y = 0.0
-                avg_min = 0.0
-                avg_max = 0.0
-                area_limits = []
-                cross_positions = ['0'] * 3
-                for k in range(1, MathSymbol.number_subcrossings + 1):
-                    init = -1 + (i - 0.5) * step + k * substep                    
-                    line = [ (init, -1.1), (init, 1.1) ]
+        #features += horizontal_avg_crossings      #active
+        features += horizontal_min_crossings      #active
+        features += horizontal_max_crossings      #active
                     
-                    current_min = 1.1
-                    current_max = -1.1
-                        
-                    for t in self.traces:
-                        current_crossings = t.getLineCrossings(line)
-    
-                        for x, y in current_crossings:
-                            avg_y += y
-                            current_min = min(current_min, y)
-                            current_max = max(current_max, y)
-
-                            #discretize y...[-1,-0.5,0,0.5,1]
-                            #disc_y = int(round((y + 1.0) * 2.0))
-                            #discretize y...[-1,,0,1]
-                            disc_y = int(round(y + 1.0))
-                            cross_positions[ disc_y ] = '1'
-                            
-                        total_crossings += float(len(current_crossings))
-
-                    #store limits 
-                    avg_min += current_min 
-                    avg_max += current_max
-                    
-                    area_limits.append( (current_min, current_max) )
-
-                v_crossings[0] = round((total_crossings * 2.0) / MathSymbol.number_subcrossings) / 2.0
+        features += vertical_count_crossings            #add discrete values...
+        
+        #features += vertical_avg_crossings        #active
+        features += vertical_min_crossings        #active
+        features += vertical_max_crossings        #active
 
-                if total_crossings > 0:
-                    v_crossings[1] = avg_y / total_crossings
-                    v_crossings[2] = avg_min / float(MathSymbol.number_subcrossings)
-                    v_crossings[3] = avg_max / float(MathSymbol.number_subcrossings)
+        
+        #features += vertical_dist_crossings
+        #features += vertical_area_crossings
+        #features += [ sum(vertical_area_crossings) ]
 
-                vertical_count_crossings.append( v_crossings[0] )  #Count Crossings 
+        return features
 
-                #discretizing... [-1.0, -0.5, 0.0, 0.5, 1.0]
-                if total_crossings > 0:
-                    avg = ((round((v_crossings[1] + 1.0) * 2.0)) / 2.0) - 1.0
-                    current_min = ((round((v_crossings[2] + 1.0) * 2.0)) / 2.0) - 1.0
-                    current_max = ((round((v_crossings[3] + 1.0) * 2.0)) / 2.0) - 1.0
-                else:
-                    avg = -2.0
-                    current_min = -2.0
-                    current_max = -2.0
-
-                #vertical_avg_crossings.append( str(avg) )             #Average         (Discrete)
-                vertical_avg_crossings.append( v_crossings[1] )       #Average         (Continuous)                
-                vertical_min_crossings.append( v_crossings[2] )       #Min             (Continuous)
-                vertical_max_crossings.append( v_crossings[3] )       #Max             (Continuous)
-
-                #The stimation of area inside min and max ...
-                total_area = 0.0
-                if len(area_limits) > 0:
-                    for k in range(len(area_limits) - 1):
-                        init_y1, end_y1 = area_limits[k]
-                        init_y2, end_y2 = area_limits[k + 1]
-
-                        if init_y1 <= end_y2 and init_y2 <= end_y1 and init_y1 <= end_y1 and init_y2 <= end_y2:
-                            #common range...
-                            #extract three segments, common and two non-commons
-                            h_common = min(end_y1, end_y2) - max(init_y1, init_y2)
-                            h_top = max(init_y1, init_y2) - min(init_y1, init_y2)
-                            h_bottom = max(end_y1, end_y2) - min(end_y1, end_y2)
-
-                            total_area += ((h_top + h_bottom) / 2.0 + h_common) * substep
-
-                vertical_area_crossings.append( total_area )
-                vertical_dist_crossings.append( str(int(''.join(cross_positions), 2)) )
-            
-            features += horizontal_count_crossings          #add discrete values...
-            
-            #features += horizontal_avg_crossings      #active
-            features += horizontal_min_crossings      #active
-            features += horizontal_max_crossings      #active
-                        
-            features += vertical_count_crossings            #add discrete values...
-            
-            #features += vertical_avg_crossings        #active
-            features += vertical_min_crossings        #active
-            features += vertical_max_crossings        #active
+    #1.5) Angular crossings....
+    def getAngularCrossingsFeatures(self):
+        #get character centroid (of the unique points)...
+        unique_points = set()
+        cx = 0.0
+        cy = 0.0
+        for t in self.traces:                
+            for x1, y1 in t.points.tolist():
+                if not (x1, y1) in unique_points:
+                    unique_points.add( (x1, y1) )
+                    cx += x1
+                    cy += y1
+
+        if len(unique_points) > 0:
+            cx /= len(unique_points)
+            cy /= len(unique_points)
 
-            
-            #features += vertical_dist_crossings
-            #features += vertical_area_crossings
-            #features += [ sum(vertical_area_crossings) ]
         
+        step = (math.pi * 0.5) / (MathSymbol.number_angular + 1)
+        substep = step / (MathSymbol.angular_subcrossings + 1)
+        n_sub = MathSymbol.angular_subcrossings
+
+        #angles of all the lines...
+        #first r between 0 and 90 degrees (to 180 and 270)
+        #second r between 90 and 180 degrees (to 270 and 360)
+        angles = []
+        for i in range(1, MathSymbol.number_angular + 1):
+            for r in range(2):
+                for k in range(1, n_sub + 1):
+                    angles.append( math.pi * 0.5 * r + (i - 0.5) * step + k * substep )
+
+        #all crossings at once...
+        line_idx, distances = self.getAngularCrossingsArrays(cx, cy, angles)
+        n_groups = len(angles) // n_sub
+        groups = line_idx // n_sub
+
+        totals = np.bincount(groups, minlength=n_groups).tolist()
+        sums = np.bincount(groups, weights=distances, minlength=n_groups).tolist()
+
+        line_min = np.empty(len(angles), dtype=np.float64)
+        line_min.fill(3.0)
+        np.minimum.at(line_min, line_idx, distances)
+        sum_min = np.cumsum(line_min.reshape((n_groups, n_sub)), axis=1)[:, -1].tolist()
+
+        line_max = np.empty(len(angles), dtype=np.float64)
+        line_max.fill(-3.0)
+        np.maximum.at(line_max, line_idx, distances)
+        sum_max = np.cumsum(line_max.reshape((n_groups, n_sub)), axis=1)[:, -1].tolist()
         
-        #1.5) Angular crossings....
-        if MathSymbol.useAngularCrossings:
-            #get character centroid...
-            #try using a threshold for avoiding dense regions affecting
-            points = []
-            threshold = 0.0 #use squared value of distance
-            cx = 0.0
-            cy = 0.0
-            for t in self.traces:                
-                for x1, y1 in t.points:
-                    found = False
-                    for x2, y2 in points:
-                        if (x1 - x2) ** 2 + (y1 - y2) ** 2 <=  threshold:
-                            found = True
-                            break
-
-                    if not found:
-                        points.append( (x1, y1) )
-                        cx += x1
-                        cy += y1
-
-            if len(points) > 0:
-                cx /= len(points)
-                cy /= len(points)
+        angular_count_crossings = [[],[]]
+        angular_avg_crossings = [[],[]]
+        angular_min_crossings = [[],[]]
+        angular_max_crossings = [[],[]]
+        for i in range(1, MathSymbol.number_angular + 1):
+            for r in range(2):
+                group = (i - 1) * 2 + r
 
-            
-            step = (math.pi * 0.5) / (MathSymbol.number_angular + 1)
-            substep = step / (MathSymbol.angular_subcrossings + 1)
-            
-            angular_count_crossings = [[],[]]
-            angular_avg_crossings = [[],[]]
-            angular_min_crossings = [[],[]]
-            angular_max_crossings = [[],[]]
-            for i in range(1, MathSymbol.number_angular + 1):
-                #first r between 0 and 90 degrees (to 180 and 270)
-                #second r between 90 and 180 degrees (to 270 and 360)
-                for r in range(2):
-                    a_crossings = [0, 0.0, 3.0, -3.0]
-                    total_crossings = 0
-                    avg_dis = 0.0
-                    avg_min = 0.0
-                    avg_max = 0.0
-                    
-                    for k in range(1, MathSymbol.angular_subcrossings + 1):
-                        #angle = step * i + math.pi * 0.5 * r
-                        angle = math.pi * 0.5 * r + (i - 0.5) * step + k * substep
-                            
-                        init_x = cx + 3 * math.cos(angle)
-                        init_y = cy + 3 * math.sin(angle)
-                        end_x = cx - 3 * math.cos(angle)
-                        end_y = cy - 3 * math.sin(angle)
-                        line = [ (init_x, init_y), (end_x, end_y) ]
-
-                        current_min = 3.0
-                        current_max = -3.0
-                        current_avg = 0.0
-                                                
-                        for t in self.traces:
-                            current_crossings = t.getLineCrossings(line)
-
-                            for x, y in current_crossings:
-                                dis = math.sqrt( (x - init_x) ** 2 + (y - init_y) ** 2 ) - 3
-
-                                avg_dis += dis
-                                current_min = min( current_min, dis )
-                                current_max = max( current_max, dis )
-                            
-                            total_crossings += float(len(current_crossings))
-
-                        avg_min += current_min
-                        avg_max += current_max
-
-                    a_crossings[0] = round(total_crossings / MathSymbol.angular_subcrossings)
-                                        
-                    if a_crossings[0] > 0:
-                        a_crossings[1] /= float(a_crossings[0])
-
-                    if total_crossings > 0:
-                        a_crossings[1] = avg_dis / total_crossings
-                        a_crossings[2] = avg_min / float(MathSymbol.angular_subcrossings)
-                        a_crossings[3] = avg_max / float(MathSymbol.angular_subcrossings)
-                        
-                    angular_count_crossings[r].append( a_crossings[0] )  #Count Crossings (Discrete)
-                    angular_avg_crossings[r].append( a_crossings[1] )       #Average         (Continuous)
-                    angular_min_crossings[r].append( a_crossings[2] )       #Min             (Continuous)
-                    angular_max_crossings[r].append( a_crossings[3] )       #Max             (Continuous)                
-                    
-            features += angular_count_crossings[0]            #add discrete values...
-            
-            #features += angular_avg_crossings[0]        #add continuous values...
-            features += angular_min_crossings[0]                    
-            features += angular_max_crossings[0]              
-            
-            features += angular_count_crossings[1]            #add discrete values...
-            
-            #features += angular_avg_crossings[1]        #add continuous values
-            features += angular_min_crossings[1]         
-            features += angular_max_crossings[1]
-               
-        #2) add the number of traces...
-        if MathSymbol.useTracesNumber:
-            features += [ float(len(self.traces)) ]
-                    
-        #3) generate a grid of points, get the distances at each region...
-        if MathSymbol.useDistancesGrid:
-            distances = []
-            
-            for rows, cols in MathSymbol.distance_grid:            
-                step_x = 2.0 / float(cols)
-                step_y = 2.0 / float(rows)
-                
-                for x in range(cols):
-                    for y in range(rows):
-                        px = -1.0 + step_x * (x + 0.5)
-                        py = -1.0 + step_y * (y + 0.5)
+                a_crossings = [0, 0.0, 3.0, -3.0]
+                total_crossings = float(totals[group])
 
-                        min_dist, max_dist, avg_dist = self.computePointDistance( (px, py) )
+                a_crossings[0] = round(total_crossings / n_sub)
 
-                        #original was min_dist
-                        distances.append( min_dist )
-                        distances.append( max_dist )
-                        distances.append( avg_dist )
+                if total_crossings > 0:
+                    a_crossings[1] = sums[group] / total_crossings
+                    a_crossings[2] = sum_min[group] / float(n_sub)
+                    a_crossings[3] = sum_max[group] / float(n_sub)
                     
-            features += distances
-            #features.append( distances )                           
-        
-        #4) of the line itself... (of the type that can be added across traces)
-        if MathSymbol.useLineFeatures:
-            currentLineFeatures = None        
-            for trace in self.traces:
-                lineFeatures = trace.lineCumulativeFeatures()            
+                angular_count_crossings[r].append( a_crossings[0] )  #Count Crossings (Discrete)
+                angular_avg_crossings[r].append( a_crossings[1] )       #Average         (Continuous)
+                angular_min_crossings[r].append( a_crossings[2] )       #Min             (Continuous)
+                angular_max_crossings[r].append( a_crossings[3] )       #Max             (Continuous)                
                 
-                #check if other traces..
-                if currentLineFeatures == None:
-                    currentLineFeatures = lineFeatures
-                else:
-                    
-                    for i in range(len(currentLineFeatures)):
-                        if lineFeatures[i].__class__.__name__ == "list":
-                            #combine them by adding the values inside the list...
-                            for j in range(len(lineFeatures[i])):
-                                currentLineFeatures[i][j] += lineFeatures[i][j]
-                        else:
-                            #combine them by adding the values...
-                            currentLineFeatures[i] += lineFeatures[i]
-            #create the average too
-            cumulativeAverages = []
-            for i in range(len(currentLineFeatures)):
-                if currentLineFeatures[i].__class__.__name__ == "list":
-                    avgLineFeatures = []
-                    for j in range(len(currentLineFeatures[i])):
-                        avgLineFeatures.append( currentLineFeatures[i][j] / len(self.traces) )
-                    
-                    cumulativeAverages.append( avgLineFeatures )
-                else:
-                    cumulativeAverages.append( currentLineFeatures[i] / len(self.traces) )
-            
-                        
-            features += currentLineFeatures
-            features += cumulativeAverages            
+        features = []
+        features += angular_count_crossings[0]            #add discrete values...
+        
+        #features += angular_avg_crossings[0]        #add continuous values...
+        features += angular_min_crossings[0]                    
+        features += angular_max_crossings[0]              
+        
+        features += angular_count_crossings[1]            #add discrete values...
+        
+        #features += angular_avg_crossings[1]        #add continuous values
+        features += angular_min_crossings[1]         
+        features += angular_max_crossings[1]
+
+        return features
+           
+    #2) add the number of traces...
+    def getTracesNumberFeatures(self):
+        return [ float(len(self.traces)) ]
                 
-        #5) calculate histograms of point distributions
-        if MathSymbol.useCDF:            
-            vertical_histogram = None
-            horizontal_histogram = None
+    #3) generate a grid of points, get the distances at each region...
+    def getDistancesGridFeatures(self):
+        distances = []
+
+        #the centers of the cells of all grids...
+        centers = []
+        for rows, cols in MathSymbol.distance_grid:            
+            step_x = 2.0 / float(cols)
+            step_y = 2.0 / float(rows)
             
-            total_points = 0
-            for trace in self.traces:
-                total_points += len(trace.points)
-                current_horizontal, current_vertical = trace.getHistograms(MathSymbol.n_bins)            
-                 
-                if vertical_histogram == None:
-                    horizontal_histogram = current_horizontal 
-                    vertical_histogram = current_vertical
-                else:
-                    for i in range(MathSymbol.n_bins):
-                        horizontal_histogram[i] += current_horizontal[i]
-                        vertical_histogram[i] += current_vertical[i]                        
-                
-            #normalize...
-            for i in range(MathSymbol.n_bins):
-                horizontal_histogram[i] /= float(total_points)  
-                vertical_histogram[i] /= float(total_points)
-                        
-            #generate CDF's
-            horizontal_cdf = []
-            vertical_cdf = []
-            total_horizontal = 0.0
-            total_vertical = 0.0
-            for i in range(MathSymbol.n_bins - 1):
-                #horizontal...
-                total_horizontal += horizontal_histogram[i]
-                horizontal_cdf.append( total_horizontal )
-                #vertical
-                total_vertical += vertical_histogram[i]
-                vertical_cdf.append( total_vertical )
+            for x in range(cols):
+                for y in range(rows):
+                    px = -1.0 + step_x * (x + 0.5)
+                    py = -1.0 + step_y * (y + 0.5)
+
+                    centers.append( (px, py) )
+
+        #...and their distances to the symbol, all at once
+        all_min, all_max, all_avg = self.computePointsDistances(centers)
+
+        for min_dist, max_dist, avg_dist in zip(all_min, all_max, all_avg):
+            #original was min_dist
+            distances.append( min_dist )
+            distances.append( max_dist )
+            distances.append( avg_dist )
                 
-            #threat as vectors...
-            features.append( horizontal_cdf )
-            features.append( vertical_cdf )            
+        return distances
+    
+    #4) of the line itself... (of the type that can be added across traces)
+    def getLineFeatures(self):
+        currentLineFeatures = None        
+        for trace in self.traces:
+            lineFeatures = trace.lineCumulativeFeatures()            
             
-        #6) 2D histogram
-        if MathSymbol.use2DHistogram:
-
-            for rows, cols in MathSymbol.hist_2d_grid:
-                #...for each trace...
-                bidimensional_hist = None
-                total_points = 0.0
-                for trace in self.traces:
-                    total_points += float(len(trace.points))
-                    current_histogram = trace.get2DHistogram(rows, cols)
+            #check if other traces..
+            if currentLineFeatures == None:
+                currentLineFeatures = lineFeatures
+            else:
                 
-                    if bidimensional_hist == None:
-                        #just assign...
-                        bidimensional_hist = current_histogram
+                for i in range(len(currentLineFeatures)):
+                    if lineFeatures[i].__class__.__name__ == "list":
+                        #combine them by adding the values inside the list...
+                        for j in range(len(lineFeatures[i])):
+                            currentLineFeatures[i][j] += lineFeatures[i][j]
                     else:
-                        #combine...
-                        for y in range(rows):
-                            for x in range(cols):
-                                bidimensional_hist[y][x] += current_histogram[y][x]
+                        #combine them by adding the values...
+                        currentLineFeatures[i] += lineFeatures[i]
+        #create the average too
+        cumulativeAverages = []
+        for i in range(len(currentLineFeatures)):
+            if currentLineFeatures[i].__class__.__name__ == "list":
+                avgLineFeatures = []
+                for j in range(len(currentLineFeatures[i])):
+                    avgLineFeatures.append( currentLineFeatures[i][j] / len(self.traces) )
+                
+                cumulativeAverages.append( avgLineFeatures )
+            else:
+                cumulativeAverages.append( currentLineFeatures[i] / len(self.traces) )
+        
+        return currentLineFeatures + cumulativeAverages
             
-                #then, normalize!
-                for y in range(rows):
-                    for x in range(cols):
-                        bidimensional_hist[y][x] /= total_points
+    #5) calculate histograms of point distributions
+    def getCDFFeatures(self):
+        horizontal_cdf, vertical_cdf = self.getCDFs(MathSymbol.n_bins)
             
-                #add to feature vector (as list of continuous attributes)
-                for hist in bidimensional_hist:
-                    features += hist
-
-        #7) Gabor filters...
-        if MathSymbol.useGabor:
-            for rows, cols in MathSymbol.gabor_grid:
-                symbol_gabor = [ 0.0, 0.0, 0.0, 0.0] * rows * cols
-                gabors = []
-                lengths = []
-                total_length = 0.0
-                
-                for trace in self.traces:                
-                    trace_gabor, trace_length = trace.getGabor(rows, cols)
-                    
-                    gabors.append( trace_gabor )
-                    lengths.append( trace_length )
+        #threat as vectors (one value per position)...
+        return horizontal_cdf + vertical_cdf
+        
+    #6) 2D histogram
+    def get2DHistogramFeatures(self):
+        features = []
 
-                    total_length += trace_length
+        #...for all grids at once...
+        for bidimensional_hist in self.get2DHistograms(MathSymbol.hist_2d_grid):
+            #add to feature vector (as list of continuous attributes)
+            features += bidimensional_hist
 
-                if total_length > 0.0:                    
-                    for t in range(len(self.traces)):
-                        w = lengths[t] / total_length
-                    
-                        for i in range(len(symbol_gabor)):
-                            symbol_gabor[i] += gabors[t][i] * w
-
-                features += symbol_gabor
+        return features
 
-        #8) Aspect Ratio...
-        if MathSymbol.useAspectRatio:
-            min_x = 1
-            max_x = -1
-            min_y = 1
-            max_y = -1
-            for trace in self.traces:
-                t_minX, t_maxX, t_minY, t_maxY = trace.getBoundaries()
-                min_x = min(t_minX, min_x)
-                max_x = max(t_maxX, max_x)
-                min_y = min(t_minY, min_y)
-                max_y = max(t_maxY, max_y)
-
-            w = (max_x - min_x)
-            h = (max_y - min_y)
-            if w <= 0.01:
-                w = 0.01
-            if h <= 0.01:
-                h = 0.01
-
-            #raw aspect ratio...
-            #features.append( [ (w / h) ] ) #add as a 1-D vector
-
-            #normalized aspect ratio...
-            if w > h:
-                ratio = (w / h) - 1.0
-            else:
-                ratio = -((h / w) - 1.0)
+    #7) Gabor filters...
+    def getGaborFeatures(self):
+        features = []
 
-            features += [ ratio ]
+        #...for all grids at once...
+        for symbol_gabor in self.getGaborHistograms(MathSymbol.gabor_grid):
+            features += symbol_gabor
 
-        #9) points Angular Distribution
-        if MathSymbol.usePointAngDist:
-            points = []
-            sharp_points = []
-            #put together all sharp points..
-            for trace in self.traces:
-                points += trace.points
-                sharp_points += trace.sharp_points
-
-            #get the sharp_points average....
-            avg_x = 0.0
-            avg_y = 0.0
-            for p in sharp_points:
-                x = p[1][0]
-                y = p[1][1]
-
-                avg_x += x
-                avg_y += y
-
-            avg_x /= len(sharp_points)
-            avg_y /= len(sharp_points)
-
-            #calculate angular distribution...
-            #....relative to sharp points average...
-            distribution = [ 0.0] + ([0.0] * MathSymbol.angular_bins)
-            point_w = 1.0 / len(points)
-
-            for p in points:
-                x = p[0] - avg_x
-                y = p[1] - avg_y
-                
-                dist = math.sqrt( x ** 2 + y ** 2 )
-                w0 = 1.0 - (min(dist, MathSymbol.angular_dist) / MathSymbol.angular_dist)
+        return features
 
-                divisor = (math.pi * 2) / MathSymbol.angular_bins 
+    #8) Aspect Ratio...
+    def getAspectRatioFeatures(self):
+        points = self.getPointCloud()[0]
 
-                ang_r = (math.atan2( y, x ) + math.pi) / divisor
-                
-                r0 = int(ang_r) % MathSymbol.angular_bins                 
-                r1 = (r0 + 1) % MathSymbol.angular_bins
-                
-                wr0 = ang_r - int(ang_r)
-                
-                distribution[0] += w0 * point_w
-                distribution[1 + r0] += (1.0 - w0) * wr0 * point_w
-                distribution[1 + r1] += (1.0 - w0) * (1 - wr0) * point_w
+        min_x, min_y = np.minimum(points.min(axis=0), 1).tolist()
+        max_x, max_y = np.maximum(points.max(axis=0), -1).tolist()
 
-            features += distribution
-            features += [ avg_x, avg_y ]
+        w = (max_x - min_x)
+        h = (max_y - min_y)
+        if w <= 0.01:
+            w = 0.01
+        if h <= 0.01:
+            h = 0.01
 
-        #10) features based on convex hulls of the strokes
-        if MathSymbol.useConvexArea:
-            #not used anymore
-            pass
+        #raw aspect ratio...
+        #features.append( [ (w / h) ] ) #add as a 1-D vector
 
-        #11) Subsegments:
-        if MathSymbol.useSubsegments:
+        #normalized aspect ratio...
+        if w > h:
+            ratio = (w / h) - 1.0
+        else:
+            ratio = -((h / w) - 1.0)
 
-            total_str = 0.0
-            total_curv = 0.0            
-            total_dist_str = [[ 0.0 for x in range(4) ] for y in range(4)]
-            total_dist_crv = [ 0.0 ] * 4
-            total_dist_arc = [ 0.0 ] * 4
-            for t in self.traces:
-                #length of straight lines
-                #length of curves
-                l_str, l_curv, dist_str, dist_crv, dist_arc = t.getTypeSubsegmentsInfo()                
+        return [ ratio ]
 
-                total_str += l_str
-                total_curv += l_curv
+    #9) points Angular Distribution
+    def getPointAngDistFeatures(self):
+        points, sharp_points = self.getPointCloud()
 
-                for i in range(len(total_dist_str)):
-                    for k in range(len(total_dist_str[i])):
-                        total_dist_str[i][k] += dist_str[i][k]
+        #get the sharp_points average....
+        avg_x, avg_y = (np.cumsum(sharp_points, axis=0)[-1] / len(sharp_points)).tolist()
 
-                for i in range(len(total_dist_crv)):
-                    total_dist_crv[i] += dist_crv[i]
+        #calculate angular distribution...
+        #....relative to sharp points average...
+        point_w = 1.0 / len(points)
 
-                for i in range(len(total_dist_arc)):
-                    total_dist_arc[i] += dist_arc[i]
-            
-            total_length = total_str + total_curv
-            if total_length > 0.0:
-                percent_str = ( total_str ) / ( total_length )
-            else:
-                #50%??? .... not straight, neither all curved...
-                percent_str = 0.5
-
-            #normalize distributions...
-            if total_str > 0.0:
-                for i in range(len(total_dist_str)):
-                    for k in range(len(total_dist_str[i])):
-                        total_dist_str[i][k] /= total_length
-                    
-            if total_curv > 0.0:
-                for i in range(len(total_dist_crv)):
-                    total_dist_crv[i] /= total_length
-                    
-                for i in range(len(total_dist_arc)):
-                    total_dist_arc[i] /= total_length
+        x = points[:, 0] - avg_x
+        y = points[:, 1] - avg_y
 
-            #features += [ [percent_str], [total_str], [total_curv]]
-            #features += [ [percent_str] ]
-            
-            for z in range(len(total_dist_str)):
-                if z == 0 or z == 1:
-                    x = total_dist_str[z]
-                    features += x
-                
-            #features += [[x] for x in total_dist_crv ]
-            #features += [[x] for x in total_dist_arc ]
-                        
-        #12) "Eigen" Features (based on covariance)
-        if MathSymbol.useEigenFeatures:
-            
-            #add covariance matrix of all points....
-            total_points = 0
-            mean_x = 0
-            mean_y = 0
-            for i in range(len(self.traces)):
-                points = self.traces[i].points
+        dist = np.sqrt( np.power(x, 2) + np.power(y, 2) )
+        w0 = 1.0 - (np.minimum(dist, MathSymbol.angular_dist) / MathSymbol.angular_dist)
 
-                for x, y in points:
-                    mean_x += x
-                    mean_y += y
+        divisor = (math.pi * 2) / MathSymbol.angular_bins 
 
-                total_points += len(points)
+        ang_r = (np.arctan2( y, x ) + math.pi) / divisor
+        int_r = ang_r.astype(np.int64)
 
-            mean_x /= total_points
-            mean_y /= total_points
+        r0 = int_r % MathSymbol.angular_bins                 
+        r1 = (r0 + 1) % MathSymbol.angular_bins
+        
+        wr0 = ang_r - int_r
 
-            var_x = 0
-            var_y = 0
-            cov_xy = 0
-            for i in range(len(self.traces)):
-                points = self.traces[i].points
+        #3 values per point (accumulated in order of the points)
+        bins = np.column_stack((np.zeros(len(points), dtype=np.int64), 1 + r0, 1 + r1)).ravel()
+        values = np.column_stack((w0 * point_w, (1.0 - w0) * wr0 * point_w, (1.0 - w0) * (1 - wr0) * point_w)).ravel()
 
-                for x, y in points:
-                    var_x += (x - mean_x) ** 2
-                    var_y += (y - mean_y) ** 2
-                    cov_xy += (x - mean_x) * (y - mean_y)
+        distribution = np.bincount(bins, weights=values, minlength=1 + MathSymbol.angular_bins).tolist()
 
-            var_x /= total_points
-            var_y /= total_points
-            cov_xy /= total_points
+        return distribution + [ avg_x, avg_y ]
 
-            features += [ var_x, var_y, cov_xy ]
+    #11) Subsegments:
+    def getSubsegmentsFeatures(self):
+        total_str = 0.0
+        total_curv = 0.0            
+        total_dist_str = [[ 0.0 for x in range(4) ] for y in range(4)]
+        total_dist_crv = [ 0.0 ] * 4
+        total_dist_arc = [ 0.0 ] * 4
+        for t in self.traces:
+            #length of straight lines
+            #length of curves
+            l_str, l_curv, dist_str, dist_crv, dist_arc = t.getTypeSubsegmentsInfo()                
 
-        #13) Size ratio relative to AVG of other symbols...
-        if MathSymbol.useSizeRatio:
-            features += [ self.w_ratio, self.h_ratio ]
-            
-            
-        
-        return features
+            total_str += l_str
+            total_curv += l_curv
 
-    #get a list of the types of the features currently in use
-    def getFeaturesTypes(self):
-        types = []
-                           
-        #1) Crossings        
-        if MathSymbol.useCrossings:
-            #use as list of discrete values
-            #cross_types = ['d'] * MathSymbol.number_crossings
-            cross_types = ['c'] * MathSymbol.number_crossings
-            
-            #use as a list of continuous attributes...
-            #cross_types += ([ 'c' ] * MathSymbol.number_crossings * 3)
+            for i in range(len(total_dist_str)):
+                for k in range(len(total_dist_str[i])):
+                    total_dist_str[i][k] += dist_str[i][k]
 
-            cross_types += ([ 'c' ] * MathSymbol.number_crossings * 2)
-            #cross_types += ([ 'd' ] * MathSymbol.number_crossings * 2 + ['v1'] * MathSymbol.number_crossings * 1)
-                                             
-            types += cross_types * 2 #horizontal + vertical
-        
-        #1.5) Angular Crossings...
-        if MathSymbol.useAngularCrossings:
-            #use as list of discrete values
-            #cross_types = ['d'] * MathSymbol.number_angular
-            cross_types = ['c'] * MathSymbol.number_angular
-            
-            #use as list of continuous attributes...
-            #cross_types += ([ 'c' ] * MathSymbol.number_angular * 3)
-            cross_types += ([ 'c' ] * MathSymbol.number_angular * 2)
-                        
-            types += cross_types * 2    #region 1 + region 2
-            
-        
-        #2) # Traces (Discrete)
-        if MathSymbol.useTracesNumber:
-            types += [ 'c' ]
-        
-        #3) Distances of points (Continuous)
-        if MathSymbol.useDistancesGrid:
-            #using as a list of continuous attributes        
-            #types += [ 'c' for x in range(MathSymbol.size_grid * MathSymbol.size_grid) ]
-            for rows, cols in MathSymbol.distance_grid:
-                types += [ 'c' ] * rows * cols * 3
-            
-            #un-comment when using as a vector       
-            #types += [ ('v' + str((MathSymbol.size_grid * MathSymbol.size_grid))) ]
-        
-        #4) of the lines...plus averages...
-        if MathSymbol.useLineFeatures:
-            #some of these might be used as vectors...
-            types += (self.traces[0].lineCumulativeFeaturesTypes() * 2)            
-        
-        #5) types of the CDF's (continuous)
-        if MathSymbol.useCDF:        
-            #Un-comment when used as list of continuous attributes
-            #types += [ 'c' for x in range((MathSymbol.n_bins - 1) * 2)]
-            
-            #Un-comment when used as vector for histograms
-            #types += ([ 'v' + str(MathSymbol.n_bins) ] * 2)
-            
-            #used as vector of cumulative distribution function
-            #types += ([ 'v' + str(MathSymbol.n_bins - 1) ] * 2)
+            for i in range(len(total_dist_crv)):
+                total_dist_crv[i] += dist_crv[i]
 
-            types += ([ 'v1' ] * (MathSymbol.n_bins - 1) * 2)
-            
+            for i in range(len(total_dist_arc)):
+                total_dist_arc[i] += dist_arc[i]
         
-        #6) 2D histogram 
-        if MathSymbol.use2DHistogram:
-            for rows, cols in MathSymbol.hist_2d_grid:
-                types += ([ 'c' ] * rows * cols )
+        total_length = total_str + total_curv
+        if total_length > 0.0:
+            percent_str = ( total_str ) / ( total_length )
+        else:
+            #50%??? .... not straight, neither all curved...
+            percent_str = 0.5
+
+        #normalize distributions...
+        if total_str > 0.0:
+            for i in range(len(total_dist_str)):
+                for k in range(len(total_dist_str[i])):
+                    total_dist_str[i][k] /= total_length
+                
+        if total_curv > 0.0:
+            for i in range(len(total_dist_crv)):
+                total_dist_crv[i] /= total_length
+                
+            for i in range(len(total_dist_arc)):
+                total_dist_arc[i] /= total_length
 
-        #7) Gabor
-        if MathSymbol.useGabor:
-            for rows, cols in MathSymbol.gabor_grid:
-                types += [ 'c', 'c', 'c', 'c' ] * rows * cols
-                #types += [ 'v4' ] * size * size
+        #features += [ [percent_str], [total_str], [total_curv]]
+        #features += [ [percent_str] ]
 
-        #8) Aspect Ratio
-        if MathSymbol.useAspectRatio:
-            types += ['c']
+        features = []
+        for z in range(len(total_dist_str)):
+            if z == 0 or z == 1:
+                x = total_dist_str[z]
+                features += x
             
+        #features += [[x] for x in total_dist_crv ]
+        #features += [[x] for x in total_dist_arc ]
 
-        #9) Sharp points Angular Dist
-        if MathSymbol.usePointAngDist:
-            types += (['c'] + (['c'] * MathSymbol.angular_bins))
-            types += ['c','c']
+        return features
 
-        #10) Convex Hull Area:
-        if MathSymbol.useConvexArea:
-            #not used anymore
-            pass
+    #12) "Eigen" Features (based on covariance)
+    def getEigenFeatures(self):
+        points = self.getPointCloud()[0]
+
+        #add covariance matrix of all points....
+        total_points = len(points)
+        mean_x, mean_y = (np.cumsum(points, axis=0)[-1] / total_points).tolist()
+
+        d_x = points[:, 0] - mean_x
+        d_y = points[:, 1] - mean_y
+
+        var_x = float(np.cumsum(np.power(d_x, 2))[-1]) / total_points
+        var_y = float(np.cumsum(np.power(d_y, 2))[-1]) / total_points
+        cov_xy = float(np.cumsum(d_x * d_y)[-1]) / total_points
+
+        return [ var_x, var_y, cov_xy ]
+
+    #13) Size ratio relative to AVG of other symbols...
+    def getSizeRatioFeatures(self):
+        return [ self.w_ratio, self.h_ratio ]
+
+    #Gets the cumulative distributions of the x and y coordinates of the
+    #points of the symbol, using histograms of the given number of bins
+    def getCDFs(self, bins):
+        points = self.getPointCloud()[0]
+        total_points = float(points.shape[0])
+
+        horizontal_histogram = np.bincount(TraceInfo.getHistogramBins(points[:, 0], bins), minlength=bins)
+        vertical_histogram = np.bincount(TraceInfo.getHistogramBins(points[:, 1], bins), minlength=bins)
+
+        #normalize and accumulate...
+        horizontal_cdf = np.cumsum(horizontal_histogram[:bins - 1] / total_points).tolist()
+        vertical_cdf = np.cumsum(vertical_histogram[:bins - 1] / total_points).tolist()
+
+        return horizontal_cdf, vertical_cdf
+
+    #Gets the normalized 2D histograms of the points of the symbol for each grid of
+    #(rows, cols) in the given list, all computed at once.
+    #Returns one list of rows * cols values (row by row) per grid
+    def get2DHistograms(self, grids):
+        points = self.getPointCloud()[0]
+        total_points = float(points.shape[0])
+
+        #trace of each one of the 4 bins of each point
+        n_traces = len(self.traces)
+        trace_idx = np.repeat(np.arange(n_traces), [ 4 * len(t.points) for t in self.traces ])
+
+        #one histogram per trace and grid, stacked in a single array...
+        all_bins = []
+        all_weights = []
+        offsets = []
+        size = 0
+        for rows, cols in grids:
+            bins, weights = TraceInfo.getBilinearBins(points, rows, cols)
+
+            all_bins.append(size + trace_idx * (rows * cols) + bins)
+            all_weights.append(weights)
+            offsets.append(size)
+
+            size += n_traces * rows * cols
+
+        #(accumulated in order of the points)
+        histograms = np.bincount(np.concatenate(all_bins), weights=np.concatenate(all_weights), minlength=size)
+
+        #the histograms of the traces are combined in order, and then normalized
+        result = []
+        for (rows, cols), offset in zip(grids, offsets):
+            traces_hist = histograms[offset:offset + n_traces * rows * cols].reshape((n_traces, rows * cols))
+
+            result.append( (np.cumsum(traces_hist, axis=0)[-1] / total_points).tolist() )
+
+        return result
+
+    #Computes the histograms of slope orientations of the symbol for a list of grids
+    #(rows, cols). The segments of all the traces are distributed in a single pass, 
+    #and the histogram of each trace is weighted by its relative length
+    def getGaborHistograms(self, grids):
+        n_traces = len(self.traces)
+
+        #segments of all the traces (excluding the ones between traces)
+        points = self.getPointCloud()[0]
+        n_segments = np.array([ len(t.points) - 1 for t in self.traces ])
+        valid = np.ones(points.shape[0] - 1, dtype=bool)
+        valid[np.cumsum(n_segments + 1)[:-1] - 1] = False
+
+        mid_points = ((points[:-1] + points[1:]) / 2)[valid]
+        diff = (points[1:] - points[:-1])[valid]
+        distances = np.sqrt(diff[:, 0] * diff[:, 0] + diff[:, 1] * diff[:, 1])
+        angles = np.arctan2(diff[:, 1], diff[:, 0])
+
+        #length of each trace and relative weight of each segment within its trace
+        starts = np.cumsum(n_segments) - n_segments
+        lengths = [ float(distances[s:s + n].sum()) for s, n in zip(starts, n_segments) ]
+        total_length = 0.0
+        for length in lengths:
+            total_length += length
+
+        segment_trace = np.repeat(np.arange(n_traces), n_segments)
+        trace_lengths = np.array(lengths)[segment_trace]
+        wl = distances / np.where(trace_lengths > 0.0, trace_lengths, 1.0)
+
+        #one histogram per trace and grid, stacked in a single array...
+        all_bins = []
+        all_values = []
+        offsets = []
+        size = 0
+        for rows, cols in grids:
+            bins, values = TraceInfo.getOrientationBins(mid_points, angles, wl, rows, cols)
+            per_segment = bins.shape[0] // max(mid_points.shape[0], 1)
+
+            all_bins.append(size + np.repeat(segment_trace, per_segment) * (4 * rows * cols) + bins)
+            all_values.append(values)
+            offsets.append(size)
+
+            size += n_traces * 4 * rows * cols
+
+        #(accumulated in order of the segments)
+        histograms = np.bincount(np.concatenate(all_bins), weights=np.concatenate(all_values), minlength=size)
+
+        #the histograms of the traces are combined in order, weighted by their length
+        result = []
+        for (rows, cols), offset in zip(grids, offsets):
+            if total_length > 0.0:
+                traces_gabor = histograms[offset:offset + n_traces * 4 * rows * cols].reshape((n_traces, 4 * rows * cols))
+                weights = np.array([ length / total_length for length in lengths ])
 
-        #11) Subsegments:
-        if MathSymbol.useSubsegments:
-            types += self.traces[0].getSubsegmentsFeaturesTypes()
+                result.append( np.cumsum(traces_gabor * weights[:, None], axis=0)[-1].tolist() )
+            else:
+                result.append( [ 0.0, 0.0, 0.0, 0.0] * rows * cols )
 
-        #12) Eigen features:
-        if MathSymbol.useEigenFeatures:
-            types += [ 'c' ] * 3
+        return result
 
-        #13) Size ratio relative to AVG of other symbols...
-        if MathSymbol.useSizeRatio:
-            types += [ 'c', 'c' ]
-            
-        
-        return types
+    #Finds the crossings of all the traces with a batch of lines given as
+    #rows of (x1, y1, x2, y2). Returns three arrays (line index, x, y) sorted by 
+    #line, and for each line by trace and then by segment
+    def getCrossingsArrays(self, lines):
+        all_lines = []
+        all_x = []
+        all_y = []
+        for t in self.traces:
+            line_idx, c_x, c_y = t.getCrossingsArrays(lines)
+
+            all_lines.append(line_idx)
+            all_x.append(c_x)
+            all_y.append(c_y)
+
+        line_idx = np.concatenate(all_lines)
+        order = np.argsort(line_idx, kind='mergesort')
+
+        return line_idx[order], np.concatenate(all_x)[order], np.concatenate(all_y)[order]
+
+    #Finds the crossings of all the traces with lines of length 6 centered at (cx, cy) 
+    #with the given angles, using the same crossing tests of the other lines (a line 
+    #through a vertex crosses both segments that share it). Returns two arrays 
+    #(line index, distance) with the distance from the middle of the line to each 
+    #crossing (towards the start of the line), sorted by line, and for each line by 
+    #trace and then by segment
+    def getAngularCrossingsArrays(self, cx, cy, angles):
+        lines = []
+        for angle in angles:
+            init_x = cx + 3 * math.cos(angle)
+            init_y = cy + 3 * math.sin(angle)
+            end_x = cx - 3 * math.cos(angle)
+            end_y = cy - 3 * math.sin(angle)
+            lines.append( (init_x, init_y, end_x, end_y) )
+
+        line_idx, c_x, c_y = self.getCrossingsArrays(lines)
+
+        #distance to the start of each line...
+        lines = np.array(lines, dtype=np.float64)
+        d_x = c_x - lines[line_idx, 0]
+        d_y = c_y - lines[line_idx, 1]
+        distances = np.sqrt(np.power(d_x, 2) + np.power(d_y, 2)) - 3
+
+        return line_idx, distances
+
+    #Computes the crossings features for a set of scanlines (horizontal or vertical)
+    #at the given positions, number_subcrossings consecutive lines per each crossing line.
+    #Returns the lists of (count, average, min, max, area, distribution) of
+    #the crossings for each crossing line
+    def getScanlineCrossings(self, positions, horizontal, substep):
+        n_sub = MathSymbol.number_subcrossings
+        n_lines = len(positions)
+        n_groups = n_lines // n_sub
+
+        positions = np.array(positions, dtype=np.float64)
+        lines = np.empty((n_lines, 4), dtype=np.float64)
+        if horizontal:
+            lines[:, 0] = -1.1
+            lines[:, 1] = positions
+            lines[:, 2] = 1.1
+            lines[:, 3] = positions
+        else:
+            lines[:, 0] = positions
+            lines[:, 1] = -1.1
+            lines[:, 2] = positions
+            lines[:, 3] = 1.1
+
+        #all crossings at once, only the position along the line is used...
+        line_idx, c_x, c_y = self.getCrossingsArrays(lines)
+        values = c_x if horizontal else c_y
+        groups = line_idx // n_sub
+
+        #number of crossings and sum of their positions per crossing line
+        totals = np.bincount(groups, minlength=n_groups).tolist()
+        sums = np.bincount(groups, weights=values, minlength=n_groups).tolist()
+
+        #limits of the crossings per line (1.1, -1.1 if none)
+        line_min = np.empty(n_lines, dtype=np.float64)
+        line_min.fill(1.1)
+        np.minimum.at(line_min, line_idx, values)
+        line_min = line_min.reshape((n_groups, n_sub))
+
+        line_max = np.empty(n_lines, dtype=np.float64)
+        line_max.fill(-1.1)
+        np.maximum.at(line_max, line_idx, values)
+        line_max = line_max.reshape((n_groups, n_sub))
+
+        #(accumulated in order of the lines)
+        sum_min = np.cumsum(line_min, axis=1)[:, -1].tolist()
+        sum_max = np.cumsum(line_max, axis=1)[:, -1].tolist()
+
+        #The stimation of area inside min and max of consecutive lines ...
+        init_1 = line_min[:, :-1]
+        end_1 = line_max[:, :-1]
+        init_2 = line_min[:, 1:]
+        end_2 = line_max[:, 1:]
+        common = (init_1 <= end_2) & (init_2 <= end_1) & (init_1 <= end_1) & (init_2 <= end_2)
+
+        #extract three segments, common and two non-commons
+        w_common = np.minimum(end_1, end_2) - np.maximum(init_1, init_2)
+        w_left = np.maximum(init_1, init_2) - np.minimum(init_1, init_2)
+        w_right = np.maximum(end_1, end_2) - np.minimum(end_1, end_2)
+        areas = np.where(common, ((w_left + w_right) / 2.0 + w_common) * substep, 0.0)
+        total_areas = np.zeros((n_groups, 1), dtype=np.float64)
+        if n_sub > 1:
+            total_areas = np.cumsum(areas, axis=1)
+        total_areas = total_areas[:, -1].tolist()
+
+        #discretize positions...[-1,0,1] (rounding half away from zero)
+        shifted = values + 1.0
+        disc = np.floor(shifted)
+        disc = (disc + (shifted - disc >= 0.5)).astype(np.int64)
+        cross_positions = np.zeros((n_groups, 3), dtype=np.int64)
+        cross_positions[groups, disc] = 1
+        distributions = (cross_positions[:, 0] * 4 + cross_positions[:, 1] * 2 + cross_positions[:, 2]).tolist()
+
+        count_crossings = []
+        avg_crossings = []
+        min_crossings = []
+        max_crossings = []
+        area_crossings = []
+        dist_crossings = []
+        for i in range(n_groups):
+            crossings = [0, 0.0, 1.1, -1.1]
+            total_crossings = float(totals[i])
+
+            crossings[0] = round((total_crossings * 2.0) / n_sub) / 2.0
+
+            if total_crossings > 0:
+                crossings[1] = sums[i] / total_crossings
+                crossings[2] = sum_min[i] / float(n_sub)
+                crossings[3] = sum_max[i] / float(n_sub)
+
+            count_crossings.append( crossings[0] )      #Count Crossings 
+            avg_crossings.append( crossings[1] )        #Average         (Continuous)
+            min_crossings.append( crossings[2] )        #Min             (Continuous)
+            max_crossings.append( crossings[3] )        #Max             (Continuous)
+            area_crossings.append( total_areas[i] )
+            dist_crossings.append( str(distributions[i]) )
+
+        return count_crossings, avg_crossings, min_crossings, max_crossings, area_crossings, dist_crossings
 
     #Filter the list of crossins by removing interesections that are too close
     #and could be considered a single intersection.
@@ -984,7 +987,7 @@ class MathSymbol:
         for t in self.traces:
 
             polyline = ''
-            for p in t.points:
+            for p in t.points.tolist():
                 x, y = p
                 polyline += str(x) + "," + str(y) + ' '
                 f.write('<circle cx="' + str(x) + '" cy="' + str(y) + '" r="0.01" fill="blue"/>\n')
@@ -999,7 +1002,7 @@ class MathSymbol:
 
                     line = ''
                     for p in range(init, end + 1):
-                        x, y = t.points[p]
+                        x, y = t.points[p].tolist()
                         line += str(x) + "," + str(y) + ' '
                     f.write('<polyline class="' + pen + '" fill="none" points="' + line + '"/>\n')
 
@@ -1012,39 +1015,346 @@ class MathSymbol:
 
     #remove the duplicated points from a list of points
     def removeDuplicatedPoints(self,points):
-        i = 0
-        while i < len(points):
-            j = i + 1
-            while j < len(points):
-                if points[i] == points[j]:
-                    del points[j]
-                else:
-                    j += 1
-                    
-            i += 1
+        unique_points = set()
+        pos = 0
+        for p in points:
+            if not p in unique_points:
+                unique_points.add(p)
+                points[pos] = p
+                pos += 1
+
+        del points[pos:]
 
     #compute distance between point and traces...
     def computePointDistance(self, point):
-        min_dist = None
-        max_dist = None
-        avg_dist = 0.0
-        p_count = 0
+        all_min, all_max, all_avg = self.computePointsDistances([ point ])
+
+        return (all_min[0], all_max[0], all_avg[0])
+
+    #computes the min, max and average distances between each one of the given points
+    #and all the points of the symbol. Returns three lists (one value per given point)
+    def computePointsDistances(self, points):
+        centers = np.array(points, dtype=np.float64).reshape((-1, 2))
+        all_points = self.getPointCloud()[0]
+        p_count = all_points.shape[0]
+
+        if cKDTree is not None and p_count > MathSymbol.distance_index_points:
+            #very long symbol, use a spatial index for the min distances...
+            min_dist = cKDTree(all_points).query(centers)[0]
+
+            #...max and average need all distances, computed by blocks of points
+            max_dist = np.zeros(centers.shape[0], dtype=np.float64)
+            avg_dist = np.zeros(centers.shape[0], dtype=np.float64)
+            for start in range(0, p_count, MathSymbol.distance_index_points):
+                block = all_points[start:start + MathSymbol.distance_index_points]
+                dist = self.getDistancesMatrix(centers, block)
+
+                max_dist = np.maximum(max_dist, dist.max(axis=1))
+                avg_dist += dist.sum(axis=1)
+        else:
+            dist = self.getDistancesMatrix(centers, all_points)
+
+            min_dist = dist.min(axis=1)
+            max_dist = dist.max(axis=1)
+            avg_dist = dist.sum(axis=1)
+
+        avg_dist /= float(p_count)
+
+        return min_dist.tolist(), max_dist.tolist(), avg_dist.tolist()
+
+    #distances between every point in a (rows) and every point in b (columns)
+    def getDistancesMatrix(self, a, b):
+        d_x = a[:, 0, None] - b[:, 0]
+        d_y = a[:, 1, None] - b[:, 1]
+
+        return np.sqrt(d_x * d_x + d_y * d_y)
+
+
+#=====================================================================
+#  The plan used to extract the features of a symbol. It is built 
+#  once from the configuration of MathSymbol, and it contains the
+#  ordered list of extractors (one per family of features) with
+#  the position of their values in the features vector, and
+#  the types and names of all the features.
+#
+#=====================================================================
 
-        p_x, p_y = point
+class FeaturePlan(object):
+    #constructor
+    def __init__(self, config):
+        self.config = config
+        self.extractors = []
+        self.types = []
+        self.names = []
+        self.size = 0
+
+        #1) Crossings
+        if MathSymbol.useCrossings:
+            #use as list of discrete values
+            #cross_types = ['d'] * MathSymbol.number_crossings
+            cross_types = ['c'] * MathSymbol.number_crossings
+            
+            #use as a list of continuous attributes...
+            #cross_types += ([ 'c' ] * MathSymbol.number_crossings * 3)
+
+            cross_types += ([ 'c' ] * MathSymbol.number_crossings * 2)
+            #cross_types += ([ 'd' ] * MathSymbol.number_crossings * 2 + ['v1'] * MathSymbol.number_crossings * 1)
+
+            names = []
+            for direction in ['horizontal', 'vertical']:
+                for value in ['count', 'min', 'max']:
+                    names += self.getIndexedNames(direction + '_' + value + '_crossings', MathSymbol.number_crossings)
+
+            self.addExtractor("crossings", MathSymbol.getCrossingsFeatures, cross_types * 2, names) #horizontal + vertical
         
-        for t in self.traces:
-            p_count += len(t.points)
+        #1.5) Angular Crossings...
+        if MathSymbol.useAngularCrossings:
+            #use as list of discrete values
+            #cross_types = ['d'] * MathSymbol.number_angular
+            cross_types = ['c'] * MathSymbol.number_angular
+            
+            #use as list of continuous attributes...
+            #cross_types += ([ 'c' ] * MathSymbol.number_angular * 3)
+            cross_types += ([ 'c' ] * MathSymbol.number_angular * 2)
 
-            for x, y in t.points:
-                dist = math.sqrt( (p_x - x) ** 2 + (p_y - y) ** 2 )
+            names = []
+            for region in ['1', '2']:
+                for value in ['count', 'min', 'max']:
+                    names += self.getIndexedNames('angular_' + value + '_crossings_r' + region, MathSymbol.number_angular)
+                        
+            self.addExtractor("angular_crossings", MathSymbol.getAngularCrossingsFeatures, cross_types * 2, names) #region 1 + region 2
+        
+        #2) # Traces (Discrete)
+        if MathSymbol.useTracesNumber:
+            self.addExtractor("traces_number", MathSymbol.getTracesNumberFeatures, [ 'c' ], [ 'traces_number' ])
+        
+        #3) Distances of points (Continuous)
+        if MathSymbol.useDistancesGrid:
+            #using as a list of continuous attributes        
+            types = []
+            names = []
+            for rows, cols in MathSymbol.distance_grid:
+                types += [ 'c' ] * rows * cols * 3
 
-                if min_dist == None or dist < min_dist:
-                    min_dist = dist
-                if max_dist == None or dist > max_dist:
-                    max_dist = dist
+                #(cells in the order used to compute them, column by column)
+                for x in range(cols):
+                    for y in range(rows):
+                        for value in ['min', 'max', 'avg']:
+                            names.append( 'distances_' + str(rows) + 'x' + str(cols) + '_' + str(y) + '_' + str(x) + '_' + value )
 
-                avg_dist += dist
+            self.addExtractor("distances_grid", MathSymbol.getDistancesGridFeatures, types, names)
+        
+        #4) of the lines...plus averages...
+        if MathSymbol.useLineFeatures:
+            #some of these might be used as vectors...
+            line_names = [ 'angular_change', 'line_length', 'sharp_points' ]
+            names = [ 'total_' + name for name in line_names ] + [ 'avg_' + name for name in line_names ]
 
-        avg_dist /= float(p_count)
+            self.addExtractor("line", MathSymbol.getLineFeatures, TraceInfo.lineCumulativeFeaturesTypes() * 2, names)
+        
+        #5) types of the CDF's
+        if MathSymbol.useCDF:
+            #used as vector of cumulative distribution function
+            names = self.getIndexedNames('horizontal_cdf', MathSymbol.n_bins - 1)
+            names += self.getIndexedNames('vertical_cdf', MathSymbol.n_bins - 1)
+
+            self.addExtractor("cdf", MathSymbol.getCDFFeatures, [ 'v1' ] * (MathSymbol.n_bins - 1) * 2, names)
+        
+        #6) 2D histogram 
+        if MathSymbol.use2DHistogram:
+            types = []
+            names = []
+            for rows, cols in MathSymbol.hist_2d_grid:
+                types += ([ 'c' ] * rows * cols )
+                names += self.getGridNames('hist2d_' + str(rows) + 'x' + str(cols), rows, cols, [''])
+
+            self.addExtractor("2d_histogram", MathSymbol.get2DHistogramFeatures, types, names)
+
+        #7) Gabor
+        if MathSymbol.useGabor:
+            types = []
+            names = []
+            for rows, cols in MathSymbol.gabor_grid:
+                types += [ 'c', 'c', 'c', 'c' ] * rows * cols
+                names += self.getGridNames('gabor_' + str(rows) + 'x' + str(cols), rows, cols,
+                                           [ '_0', '_45', '_90', '_135' ])
+
+            self.addExtractor("gabor", MathSymbol.getGaborFeatures, types, names)
+
+        #8) Aspect Ratio
+        if MathSymbol.useAspectRatio:
+            self.addExtractor("aspect_ratio", MathSymbol.getAspectRatioFeatures, [ 'c' ], [ 'aspect_ratio' ])
+
+        #9) Sharp points Angular Dist
+        if MathSymbol.usePointAngDist:
+            types = (['c'] + (['c'] * MathSymbol.angular_bins)) + ['c','c']
+            names = [ 'point_ang_center' ] + self.getIndexedNames('point_ang_bin', MathSymbol.angular_bins)
+            names += [ 'sharp_points_avg_x', 'sharp_points_avg_y' ]
+
+            self.addExtractor("point_angular_distribution", MathSymbol.getPointAngDistFeatures, types, names)
+
+        #10) Convex Hull Area:
+        if MathSymbol.useConvexArea:
+            #not used anymore
+            pass
+
+        #11) Subsegments:
+        if MathSymbol.useSubsegments:
+            names = self.getIndexedNames('subsegments_str_0', 4) + self.getIndexedNames('subsegments_str_1', 4)
+
+            self.addExtractor("subsegments", MathSymbol.getSubsegmentsFeatures, TraceInfo.getSubsegmentsFeaturesTypes(), names)
+
+        #12) Eigen features:
+        if MathSymbol.useEigenFeatures:
+            self.addExtractor("eigen", MathSymbol.getEigenFeatures, [ 'c' ] * 3, [ 'var_x', 'var_y', 'cov_xy' ])
+
+        #13) Size ratio relative to AVG of other symbols...
+        if MathSymbol.useSizeRatio:
+            self.addExtractor("size_ratio", MathSymbol.getSizeRatioFeatures, [ 'c', 'c' ], [ 'width_ratio', 'height_ratio' ])
+
+    #adds an extractor for a family of features at the end of the vector
+    def addExtractor(self, family, extractor, types, names):
+        if len(types) != len(names):
+            raise Exception("Number of types and names of features do not match")
+
+        self.extractors.append( (family, extractor, self.size, self.size + len(types)) )
+        self.types += types
+        self.names += names
+        self.size += len(types)
+
+    #names for a list of values
+    def getIndexedNames(self, prefix, count):
+        return [ prefix + '_' + str(i) for i in range(count) ]
+
+    #names for the values of the cells of a grid (row by row)
+    def getGridNames(self, prefix, rows, cols, suffixes):
+        names = []
+        for row in range(rows):
+            for col in range(cols):
+                for suffix in suffixes:
+                    names.append( prefix + '_' + str(row) + '_' + str(col) + suffix )
+
+        return names
+
+    #gets the list of families of features in the plan and their number of features
+    def getFamilies(self):
+        return [ (family, end - start) for family, extractor, start, end in self.extractors ]
+
+    #gets the extractors required to compute the given features (as indices in the vector)
+    def getRequiredExtractors(self, indices):
+        required = np.zeros(self.size, dtype=bool)
+        required[indices] = True
+
+        return [ (family, extractor, start, end) for family, extractor, start, end in self.extractors
+                 if required[start:end].any() ]
+
+    #Computes the features of the symbol. They are written in the given
+    #vector if any, or in a new one (float64). If a list of extractors is given
+    #only those are used, and the other features of a new vector are 0.0
+    def extract(self, symbol, out=None, extractors=None):
+        if extractors is None:
+            extractors = self.extractors
+
+            if out is None:
+                out = np.empty(self.size, dtype=np.float64)
+        elif out is None:
+            out = np.zeros(self.size, dtype=np.float64)
+
+        if MathSymbol.profileFeatures:
+            self.extractProfiled(symbol, out, extractors)
+        else:
+            for family, extractor, start, end in extractors:
+                out[start:end] = extractor(symbol)
+
+        #the tables of segments are only shared by the families of one extraction
+        symbol.releaseSegmentTables()
+
+        return out
+
+    #same as extract, but also accumulates the time and calls of each family
+    def extractProfiled(self, symbol, out, extractors):
+        for family, extractor, start, end in extractors:
+            time_start = time.time()
+
+            out[start:end] = extractor(symbol)
+
+            features_times[family] = features_times.get(family, 0.0) + (time.time() - time_start)
+            features_calls[family] = features_calls.get(family, 0) + 1
+
+        return out
+
+
+#=====================================================================
+#  Cost of the families of features. When MathSymbol.profileFeatures 
+#  is set, the time spent on each family (in seconds) is accumulated
+#  in features_times, and the number of calls in features_calls
+#  (only for the features computed on the current process)
+#
+#=====================================================================
+
+features_times = {}
+features_calls = {}
+
+def reset_features_times():
+    features_times.clear()
+    features_calls.clear()
+
+
+#Computes the features of a list of symbols using the plan of the current configuration.
+#Returns a matrix with one row per symbol (filled in place) of the given dtype (features
+#are always computed in double precision, np.float32 only changes how they are stored).
+#The symbols can be split in blocks between a pool of worker processes, the rows keep
+#the order of the symbols. If progress_callback is given, it is called with the number
+#of symbols done and the total
+def extract_features_batch(symbols, workers=1, progress_callback=None, dtype=np.float64):
+    plan = MathSymbol.getFeaturePlan()
+
+    n_symbols = len(symbols)
+    features = np.zeros((n_symbols, plan.size), dtype=dtype)
+
+    if workers <= 1 or n_symbols <= 1:
+        for idx, symbol in enumerate(symbols):
+            plan.extract(symbol, features[idx])
+
+            if progress_callback is not None:
+                progress_callback(idx + 1, n_symbols)
+    else:
+        #a few blocks per worker to balance the work...
+        block_size = max(1, n_symbols // (workers * 4))
+        blocks = [ (plan.config, dtype, symbols[start:start + block_size]) for start in range(0, n_symbols, block_size) ]
+
+        pool = multiprocessing.Pool(workers)
+        try:
+            done = 0
+            #(blocks are returned in order)
+            for block_features in pool.imap(extract_features_block, blocks):
+                features[done:done + block_features.shape[0]] = block_features
+                done += block_features.shape[0]
+
+                if progress_callback is not None:
+                    progress_callback(done, n_symbols)
+
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    return features
+
+#Computes the features of a block of symbols on a worker process, using
+#the same configuration of features of the main process
+def extract_features_block(block):
+    config, dtype, symbols = block
+
+    for name, value in config:
+        setattr(MathSymbol, name, value)
+
+    plan = MathSymbol.getFeaturePlan()
+
+    features = np.zeros((len(symbols), plan.size), dtype=dtype)
+    for idx, symbol in enumerate(symbols):
+        plan.extract(symbol, features[idx])
 
-        return (min_dist, max_dist, avg_dist)
+    return features
@@ -22,6 +22,8 @@
         - Richard Zanibbi: rlaz@cs.rit.edu 
 """
 import math
+import time
+import numpy as np
 
 #=====================================================================
 #  This class represents a traces, and also performs all the operations
@@ -50,16 +52,48 @@ import math
 #
 #=====================================================================
 
-class TraceInfo:    
+class TraceInfo(object):
+    #all the attributes of the trace (no per instance dictionary)
+    __slots__ = ['id', 'points', 'sharp_points', 'bounding_box', 'segments', 'original_points', 'segment_table']
+
+    #number of following points checked in bulk for each point
+    #when searching for sharp points
+    SharpPointsBand = 16
+
+    #Lean memory mode...
+    #if False, the original points are not kept at all (traces cannot be distorted)
+    keepOriginalPoints = True
+    #if True, the original points are kept in single precision
+    compactOriginalPoints = False
+
     #constructor
     def __init__(self, trace_id, trace_points):
         self.id = trace_id
-        self.points = trace_points
+        #points as a Nx2 array of (x, y) coordinates
+        self.points = np.array(trace_points, dtype=np.float64).reshape((-1, 2))
+        #sharp points as a Mx2 array of (x, y) (available after smoothing)
         self.sharp_points = None
         self.bounding_box = None
         self.segments = None
+        #table of line segments used for crossings (see getSegmentTable)
+        self.segment_table = None
         
-        self.original_points = list(trace_points)
+        #points are always replaced and never modified in place, so the original
+        #points can share the initial array (read-only to keep it that way)
+        self.points.flags.writeable = False
+        if not TraceInfo.keepOriginalPoints:
+            self.original_points = None
+        elif TraceInfo.compactOriginalPoints:
+            self.original_points = self.points.astype(np.float32)
+        else:
+            self.original_points = self.points
+
+    #returns the original points of the trace as a Nx2 array
+    def getOriginalPoints(self):
+        if self.original_points is None:
+            raise Exception("Original points were not kept for trace " + str(self.id))
+
+        return np.asarray(self.original_points, dtype=np.float64)
 
     #================================================================
     #  swap between original and current points
@@ -68,55 +102,50 @@ class TraceInfo:
     #================================================================
     def swapPoints(self):
         tempo = self.points
-        self.points = self.original_points
+        self.points = self.getOriginalPoints()
         self.original_points = tempo
 
         #out of date...
         self.bounding_box = None
 
+    #Gets a copy of the trace that can be modified (e.g. normalized) without
+    #changing this one (the arrays are shared, they are never modified in place)
+    def clone(self):
+        trace = TraceInfo.__new__(TraceInfo)
+        for attribute in TraceInfo.__slots__:
+            setattr(trace, attribute, getattr(self, attribute))
+
+        return trace
+
     #Gets current boundaries for the trace
     def getBoundaries(self):
         #only compute if it has never been computer or if it has changed...
         if self.bounding_box == None:
-            #assume first point to define all boundaries initially..
-            minX, minY = self.points[0]
-            maxX, maxY = self.points[0]
-    
-            #for each point...
-            for x, y in self.points:
-                if x < minX:
-                    minX = x
-                if x > maxX:
-                    maxX = x
-                if y < minY:
-                    minY = y
-                if y > maxY:
-                    maxY = y
+            minX, minY = self.points.min(axis=0)
+            maxX, maxY = self.points.max(axis=0)
             
-            self.bounding_box = (minX, maxX, minY, maxY) 
+            self.bounding_box = (float(minX), float(maxX), float(minY), float(maxY))
 
         return self.bounding_box    
             
     #Checks for duplicated points
     def hasDuplicatedPoints(self):
-        duplicated = False
-        for i in range(len(self.points) - 1):
-            for j in range(i + 1, len(self.points)):
-                if self.points[i][0] == self.points[j][0] and \
-                   self.points[i][1] == self.points[j][1]:
-                    duplicated = True
-        return duplicated
+        unique_points = set( tuple(p) for p in self.points.tolist() )
+
+        return len(unique_points) < len(self.points)
 
     #Convert to string representation
     def __str__(self):
         result = ''
         
-        for x, y in self.points:
+        for x, y in self.points.tolist():
             result += str(x) + "," + str(y) + "\r\n" 
             
         return result
 
     #remove duplicated points (pre processing)
+    #   a point is removed if it has the same coordinates of a previous point,
+    #   and the trace does not move away more than 10% of the diagonal between them
     def removeDuplicatedPoints(self):
 
         minX, maxX, minY, maxY = self.getBoundaries()
@@ -124,86 +153,122 @@ class TraceInfo:
         h = maxY - minY
         diagonal = math.sqrt( w * w + h * h )
         
-        i = 0
-        while i < len(self.points):
-            j = i + 1
-            while j < len(self.points):
-                if self.distance(i, j) > diagonal * 0.1:
-                    break
+        #group the indices of the points by coordinates...
+        occurrences = {}
+        for idx, p in enumerate(self.points.tolist()):
+            p = tuple(p)
+            if p in occurrences:
+                occurrences[p].append(idx)
+            else:
+                occurrences[p] = [idx]
+
+        keep = np.ones(len(self.points), dtype=bool)
+        for p, indices in occurrences.items():
+            #check every repetition against the previous one, if the trace 
+            #moved too far between them the repetition is kept
+            for k in range(1, len(indices)):
+                between = self.points[indices[k - 1] + 1:indices[k]] - p
+                distances = np.sqrt(between[:, 0] * between[:, 0] + between[:, 1] * between[:, 1])
                 
-                if self.points[i] == self.points[j]:
-                    del self.points[j]
-                else:
-                    j += 1
-            i += 1            
+                if not np.any(distances > diagonal * 0.1):
+                    keep[indices[k]] = False
+
+        if not keep.all():
+            self.points = self.points[keep]
     
     #Add points where there are missing points (pre processing)
     def addMissingPoints(self):
         #to avoid problems....
         self.removeDuplicatedPoints()
         
+        points = [ tuple(p) for p in self.points.tolist() ]
+        n_points = len(points)
+
+        #lengths of the segments of the original trace
+        lengths = [ self.pointDistance(points[i], points[i + 1]) for i in range(n_points - 1) ]
+
         #calculate Le (average segment length) as defined in [1]
         Le = 0;
-        for i in range(len(self.points) - 1):
-            Le += self.distance( i, i + 1)
-        Le /= len(self.points)
+        for lenght in lengths:
+            Le += lenght
+        Le /= n_points
         
         #the distance used to insert points...
         d = 0.95 * Le
-        i = 0        
-        while i < len(self.points) - 1:
+
+        #walk the trace only once, writing the resampled points in a new buffer
+        #current is the last point written, and k is the next point of the original trace
+        current = points[0]
+        new_points = [ current ]
+        k = 1
+        while k < n_points:
             #search point to interpolate ...
-            n = 1
-            lenght = self.distance(i, i + n)
+            start = current
+            e = k
+            lenght = self.pointDistance(current, points[k])
             sum = 0
             
-            while sum + lenght < d and i + n + 1 < len(self.points):
-                n += 1
+            while sum + lenght < d and e + 1 < n_points:
                 sum += lenght
-                lenght = self.distance(i + n - 1, i + n)
+                start = points[e]
+                lenght = lengths[e]
+                e += 1
                     
             diff = d - sum 
                                     
-            #insert a point between i + n- 1 and i +n at distance diff                                
+            #insert a point between start and e at distance diff
             #use linear interpolation...                                        
             w2 = diff / lenght            
             
             if w2 < 1.0:
-                xp = self.points[i + n - 1][0] * (1- w2) + self.points[i + n][0] * w2
-                yp = self.points[i + n - 1][1] * (1- w2) + self.points[i + n][1] * w2                  
+                xp = start[0] * (1- w2) + points[e][0] * w2
+                yp = start[1] * (1- w2) + points[e][1] * w2
                 
                 #check for collision with next point...
-                insert = True
-                                                
-                if i + n < len(self.points):
-                    if xp == self.points[i + n][0] and \
-                       yp == self.points[i + n][1]:
-                        #weird case where a point after interpolated falls of the same 
-                        #coordinates as next point, don't insert it
-                        insert = False                                            
-                             
-                                                       
-                if insert:
-                    self.points.insert(i + n, (xp, yp) )                
-                        
+                if xp == points[e][0] and yp == points[e][1]:
+                    #weird case where a point after interpolated falls of the same 
+                    #coordinates as next point, don't insert it
+                    current = points[e]
+                    k = e + 1
+                else:
+                    current = (xp, yp)
+                    k = e
             else:
-                #at the end, no point added but erase the one at the end
-                n += 1
-            
-            #now erase points from i + 1 .. f + n - 1
-            toErase = n - 1
-            for j in range(toErase):
-                del self.points[i + 1]  
-                
-            i += 1        
+                #no point added, and the one at e is skipped
+                if e + 1 >= n_points:
+                    #at the end, nothing else to add
+                    break
+
+                current = points[e + 1]
+                k = e + 2
+
+            new_points.append(current)
+
+        self.points = np.array(new_points, dtype=np.float64).reshape((-1, 2))
         
     #returns the distance between two points in the curve
     def distance(self, i, j):
-        x1, y1 = self.points[i]
-        x2, y2 = self.points[j]
+        return self.pointDistance(self.points[i], self.points[j])
+
+    #returns the distance between two given points
+    def pointDistance(self, p1, p2):
+        x1, y1 = p1
+        x2, y2 = p2
         
         return math.sqrt(math.pow((x1 - x2), 2) + math.pow((y1 - y2), 2)) 
 
+    #returns the lengths of all the line segments of the curve
+    def segmentLengths(self):
+        diff = self.points[1:] - self.points[:-1]
+
+        return np.sqrt(diff[:, 0] * diff[:, 0] + diff[:, 1] * diff[:, 1])
+
+    #returns the slope angles of all the line segments of the curve
+    def segmentAngles(self):
+        diff = self.points[1:] - self.points[:-1]
+
+        return np.arctan2(diff[:, 1], diff[:, 0])
+
     #smooths the curve (pre-processing)
     def applySmoothing(self):
         #Detect sharp points and extract them....
@@ -255,58 +320,74 @@ class TraceInfo:
     #uses the algorithm defined in [1] to find the sharp points of the trace...
     # returns a list of tuples of the form (index, (x, y))  for all the sharp points
     def getSharpPoints(self):
+        points = [ tuple(p) for p in self.points.tolist() ]
+
         #the first is a sharp point
-        sharpPoints = [ (0, self.points[0]) ]
+        sharpPoints = [ (0, points[0]) ]
         
         #now calculate the slope angles between each pair of consecutive points...
-        alpha = []
-        for i in range(len(self.points) - 1):
-            alpha.append( self.slopeAngle(self.points[i], self.points[i + 1]) )
+        alpha = self.segmentAngles()
+        n_angles = alpha.shape[0]
             
         #check
-        if len(alpha) <= 1:
+        if n_angles <= 1:
             #very special case where the trace is one single point
             #no more sharp points than itself...
             return sharpPoints 
             
         #now detect sharp points...
-        theta = [ (alpha[0] - alpha[1]) ]            
-        for k in range(1, len(self.points) - 1):
-            #use two different tests to detect sharp point...
-            #1) change in writing direction (as defined in [1])
-            #2) difference in writing direction angle between current point and
-            #   and last sharp point higher than a threshold            
-            addPoint = False
-            
-            #for 1) calculate difference in writing direction between 
-            #current point and previous point
-            if (k < len(self.points) - 2):
-                theta.append( alpha[k] - alpha[k + 1] )
-                
-                if theta[k] != 0.0 and k > 0:
-                    delta = theta[k] * theta[k - 1]
-                    
-                    if (delta <= 0.0 and theta[k - 1] != 0.0):
-                        #direction at which the pen is moving has changed                        
-                        addPoint = True
-                
-            #for 2) calculate the difference of angle between 
-            #current point and last sharp point
-            phi = self.angularDifference(alpha[sharpPoints[-1][0]], alpha[k])
-            
-            #circular angle....
-            if (phi > math.pi):
-                phi = math.pi * 2 - phi
-                
-            if (phi >= math.pi / 8):
-                addPoint = True
-                
-                
-            if addPoint:
-                sharpPoints.append( (k, self.points[k] ) )                                    
+        #use two different tests to detect sharp point...
+        #1) change in writing direction (as defined in [1])
+        #2) difference in writing direction angle between current point and
+        #   and last sharp point higher than a threshold
+
+        #for 1) the difference in writing direction between each point and the next
+        #   (theta[k] = alpha[k] - alpha[k + 1]), the direction at which the pen is 
+        #   moving has changed if the sign of theta changes at k
+        theta = alpha[:-1] - alpha[1:]
+        changed = np.zeros(n_angles, dtype=bool)
+        changed[1:-1] = (theta[1:] != 0.0) & (theta[1:] * theta[:-1] <= 0.0) & (theta[:-1] != 0.0)
+
+        #for 2) the test depends on the last sharp point found, so for every point
+        #   find in bulk the next point that would be sharp if the current was the last
+        #   sharp point, looking only at a band of the following points
+        threshold = math.pi / 8
+        band = min(TraceInfo.SharpPointsBand, n_angles - 1)
+        next_idx = np.arange(n_angles)[:, None] + np.arange(1, band + 1)
+        valid = next_idx < n_angles
+        next_idx[~valid] = n_angles - 1
+
+        diff = np.abs(alpha[:, None] - alpha[next_idx])
+        phi = np.minimum(diff, math.pi * 2 - diff)
+        is_sharp = ((phi >= threshold) | changed[next_idx]) & valid
+
+        next_sharp = np.where(is_sharp.any(axis=1), is_sharp.argmax(axis=1) + 1, 0)
+        next_sharp = (next_sharp + np.arange(n_angles)).tolist()
+
+        #now follow the chain of sharp points...
+        k = 0
+        while True:
+            last = k
+            k = next_sharp[last]
+
+            if k == last:
+                #not found in the band, check the rest of the trace
+                start = last + band + 1
+                if start >= n_angles:
+                    break
+
+                diff = np.abs(alpha[last] - alpha[start:])
+                phi = np.minimum(diff, math.pi * 2 - diff)
+                found = np.flatnonzero((phi >= threshold) | changed[start:])
+                if found.shape[0] == 0:
+                    break
+
+                k = start + int(found[0])
+
+            sharpPoints.append( (k, points[k]) )
 
         #the last point is a sharp point
-        sharpPoints.append( (len(self.points) - 1, self.points[-1]  ) )
+        sharpPoints.append( (len(points) - 1, points[-1]  ) )
         
         return sharpPoints
 
@@ -366,36 +447,65 @@ class TraceInfo:
 
     #Resample the trace using splines (pre-processing)
     def splineResample(self, sharp_points, subDivisions):                
-        new_points = []
-        
-        self.sharp_points = sharp_points
+        self.sharp_points = np.array([ p for idx, p in sharp_points ], dtype=np.float64).reshape((-1, 2))
         
         #check special case: Only one sharp_point
         if len(sharp_points) == 1:
-            self.points = [ sharp_points[0][1] ]
+            self.points = self.sharp_points.copy()
             return
-        
-        for i in range(len(sharp_points)):
-            #add the sharp point
-            new_points.append( sharp_points[i][1] )
-            
-            if i < len(sharp_points) - 1:
-                innerPoints = (sharp_points[i + 1][0] - sharp_points[i][0]) * subDivisions
-                tStep = 1.0 / innerPoints
-            
-            #depending on the current range...
-            if i == 0 or i == len(sharp_points) - 2:
-                #between first and second sharp points...
-                # or between the last two sharp points...
-                # use linear interpolation...                                                
-                for k in range(1, innerPoints):
-                    new_points.append(self.lerp(sharp_points[i][1], sharp_points[i + 1][1], tStep * k))
-
-            elif i < len(sharp_points) - 2:                
-                    #in the middle of four sharp points... use Catmull-Rom                
-                    for k in range(1, innerPoints):
-                        new_points.append(self.catmullRom(sharp_points[i - 1][1], sharp_points[i][1], sharp_points[i + 1][1], sharp_points[i + 2][1], tStep * k))
-              
+
+        n_sharp = len(sharp_points)
+        n_segments = n_sharp - 1
+
+        #points to add between each pair of consecutive sharp points
+        indices = np.array([ idx for idx, p in sharp_points ], dtype=np.int64)
+        innerPoints = (indices[1:] - indices[:-1]) * subDivisions
+        counts = innerPoints - 1
+
+        #value of t for every new point, and the segment where it belongs
+        segment = np.repeat(np.arange(n_segments), counts)
+        first = np.cumsum(counts) - counts
+        k = np.arange(segment.shape[0]) - first[segment] + 1
+        t = ((1.0 / innerPoints)[segment] * k)[:, None]
+
+        #the sharp points are kept, followed by the points of their segment
+        new_points = np.empty((n_sharp + segment.shape[0], 2), dtype=np.float64)
+        positions = np.arange(n_sharp)
+        positions[1:] += np.cumsum(counts)
+        new_points[positions] = self.sharp_points
+        inner = np.ones(new_points.shape[0], dtype=bool)
+        inner[positions] = False
+
+        #between first and second sharp points...
+        # or between the last two sharp points...
+        # use linear interpolation...
+        linear = (segment == 0) | (segment == n_segments - 1)
+        p1 = self.sharp_points[segment[linear]]
+        p2 = self.sharp_points[segment[linear] + 1]
+        t_l = t[linear]
+        values = np.empty((segment.shape[0], 2), dtype=np.float64)
+        values[linear] = p1 * (1 - t_l) + p2 * t_l
+
+        #in the middle of four sharp points... use Catmull-Rom
+        #(coefficients of the polynomial computed once for each segment)
+        if n_segments > 2:
+            x1 = self.sharp_points[:-3]
+            x2 = self.sharp_points[1:-2]
+            x3 = self.sharp_points[2:-1]
+            x4 = self.sharp_points[3:]
+
+            a = -x1 + 3*x2 -3*x3 + x4
+            b = 2*x1 -5*x2 + 4*x3 - x4
+            c = -x1+x3
+            d = 2*x2
+
+            middle = ~linear
+            s = segment[middle] - 1
+            t_m = t[middle]
+            values[middle] = 0.5 * (a[s]*t_m*t_m*t_m + b[s]*t_m*t_m + c[s]*t_m + d[s])
+
+        new_points[inner] = values
+
         #now replace
         self.points = new_points
         
@@ -420,55 +530,30 @@ class TraceInfo:
             inputHeight = 0.02  
         
         #for all points ... 
-        for i in range(len(self.points)):
-            #clamp (just to keep the function as general as possible)
-            #minX
-            if self.points[i][0] < inputBox[0]:
-                self.points[i] = (inputBox[0], self.points[i][1])
-            #maxX
-            if self.points[i][0] > inputBox[1]:                
-                self.points[i] = (inputBox[1], self.points[i][1])
-                
-            #minY
-            if self.points[i][1] < inputBox[2]:
-                self.points[i] = (self.points[i][0], inputBox[2])
-            #maxX
-            if self.points[i][1] > inputBox[3]:                
-                self.points[i] = (self.points[i][0], inputBox[3])
-                        
-            #new Coordinates
-            x = ((self.points[i][0] - inputBox[0]) / (inputWidth)) * outputWidth + outputBox[0]
-            y = ((self.points[i][1] - inputBox[2]) / (inputHeight)) * outputHeight + outputBox[2]
-            
-            #replace...
-            self.points[i] = (x, y)
+        self.points = self.relocateArray(self.points, inputBox, inputWidth, inputHeight,
+                                         outputBox, outputWidth, outputHeight)
             
         #update sharp points...
-        for i in range(len(self.sharp_points)):
-            #clamp (just to keep the function as general as possible)
-            #minX
-            if self.sharp_points[i][1][0] < inputBox[0]:
-                self.sharp_points[i] = (self.sharp_points[i][0], (inputBox[0], self.sharp_points[i][1][1]))
-            #maxX
-            if self.sharp_points[i][1][0] > inputBox[1]:
-                self.sharp_points[i] = (self.sharp_points[i][0], (inputBox[1], self.sharp_points[i][1][1]))
-            #minY
-            if self.sharp_points[i][1][1] < inputBox[2]:
-                self.sharp_points[i][1] = (self.sharp_points[i][0], (self.sharp_points[i][1][0], inputBox[2]))
-            #maxY
-            if self.sharp_points[i][1][1] > inputBox[3]:
-                self.sharp_points[i] = (self.sharp_points[i][0], (self.sharp_points[i][1][0], inputBox[3]))
-                
-            #new Coordinates
-            x = ((self.sharp_points[i][1][0] - inputBox[0]) / (inputWidth)) * outputWidth + outputBox[0]
-            y = ((self.sharp_points[i][1][1] - inputBox[2]) / (inputHeight)) * outputHeight + outputBox[2]
-            
-            #replace...
-            self.sharp_points[i] = (self.sharp_points[i][0], (x, y))
+        self.sharp_points = self.relocateArray(self.sharp_points, inputBox, inputWidth, inputHeight,
+                                               outputBox, outputWidth, outputHeight)
             
         #bounding box has changed...
         self.bounding_box = None
-                
+
+    #clamps an array of points to the input box and then 
+    #maps them to the output box
+    @staticmethod
+    def relocateArray(points, inputBox, inputWidth, inputHeight, outputBox, outputWidth, outputHeight):
+        #clamp (just to keep the function as general as possible)
+        x = np.minimum(np.maximum(points[:, 0], inputBox[0]), inputBox[1])
+        y = np.minimum(np.maximum(points[:, 1], inputBox[2]), inputBox[3])
+
+        #new Coordinates
+        relocated = np.empty(points.shape, dtype=np.float64)
+        relocated[:, 0] = ((x - inputBox[0]) / (inputWidth)) * outputWidth + outputBox[0]
+        relocated[:, 1] = ((y - inputBox[2]) / (inputHeight)) * outputHeight + outputBox[2]
+
+        return relocated
 
     #gets the count, average, and range of the points at which segments 
     #are intersect by the given line 
@@ -523,105 +608,146 @@ class TraceInfo:
     def getLineCrossings(self, line):
         l_x1, l_y1 = line[0]
         l_x2, l_y2 = line[1]
-        
+
+        line_idx, c_x, c_y = self.getCrossingsArrays([ (l_x1, l_y1, l_x2, l_y2) ])
+
+        #crossings in the same order of the segments of the trace
+        crossings = list(zip(c_x.tolist(), c_y.tolist()))
+
+        return crossings
+
+    #Calculate the crossings of the current trace with a list of lines
+    #returns one list of crossings per line (same as getLineCrossings)
+    def getLinesCrossings(self, lines):
+        line_idx, c_x, c_y = self.getCrossingsArrays([ (l[0][0], l[0][1], l[1][0], l[1][1]) for l in lines ])
+
+        #split crossings per line...
+        ends = np.cumsum(np.bincount(line_idx, minlength=len(lines))).tolist()
+        c_x = c_x.tolist()
+        c_y = c_y.tolist()
+
+        all_crossings = []
+        start = 0
+        for end in ends:
+            all_crossings.append( list(zip(c_x[start:end], c_y[start:end])) )
+            start = end
+
+        return all_crossings
+
+    #Gets the table of segments of the trace, it is built once for the current 
+    #points (normally after normalization) and used by all crossing queries until
+    #it is released (see MathSymbol.releaseSegmentTables)
+    def getSegmentTable(self):
+        if self.segment_table is None or self.segment_table.points is not self.points:
+            self.segment_table = SegmentTable(self.points)
+
+        return self.segment_table
+
+    #Calculate the crossings of the current trace with a batch of lines 
+    #given as rows of (x1, y1, x2, y2).
+    #returns three arrays (line index, x, y) with all crossings found sorted 
+    #by line, and for each line in the same order of the segments of the trace
+    def getCrossingsArrays(self, lines):
+        lines = np.asarray(lines, dtype=np.float64).reshape((-1, 4))
+        l_x1 = lines[:, 0]
+        l_y1 = lines[:, 1]
+        l_x2 = lines[:, 2]
+        l_y2 = lines[:, 3]
+
         #check minimum
-        #....x....
-        if ( l_x1 < l_x2 ):
-            l_xmin = l_x1
-            l_xmax = l_x2
-        else:
-            l_xmin = l_x2
-            l_xmax = l_x1
-        #....Y....
-        if (l_y1 < l_y2):
-            l_ymin = l_y1
-            l_ymax = l_y2
-        else:
-            l_ymin = l_y2
-            l_ymax = l_y1
+        l_xmin = np.minimum(l_x1, l_x2)
+        l_xmax = np.maximum(l_x1, l_x2)
+        l_ymin = np.minimum(l_y1, l_y2)
+        l_ymax = np.maximum(l_y1, l_y2)
 
+        #lines that are not even on the same bounding box can't have crossings...
         minX, maxX, minY, maxY = self.getBoundaries()
-        if not (minX < l_xmax and maxX > l_xmin and minY < l_ymax and maxY > l_ymin):
-            #not even on the same bounding box ...
-            return []
-        
-        if l_x1 == l_x2 and l_y1 == l_y2:
-            #it's a point, no crossings with a single point...
-            return []
-        
-        crossings = []
-        if l_x1 != l_x2:
-            #use the slope and intersect to compare...
-            l_m = (l_y2 - l_y1) / (l_x2 - l_x1)
-            l_b = l_y1 - l_m * l_x1
-            
-            #for every segment....
-            for i in range(len(self.points) - 1):
-                s_x1, s_y1 = self.points[i]
-                s_x2, s_y2 = self.points[i + 1]
-                
-                if s_x2 == s_x1:
-                    #the segment is a vertical line... 
-                    if l_xmin <= s_x1 and s_x1 <= l_xmax:
-                        #the vertical segment is inside the range of the current line...
-                        y_int = s_x1  * l_m + l_b
-                        #check if y_int in range of vertical line...
-                        if min(s_y1, s_y2) <= y_int and y_int <= max(s_y1, s_y2):
-                            #intersection found...
-                            crossings.append( (s_x1, y_int) )
-                else:
-                    #the segment is not a vertical line
-                    s_m = (s_y2 - s_y1) / (s_x2 - s_x1)
-                    s_b = s_y1 - s_m * s_x1
-                    
-                    #check if parallel
-                    if s_m == l_m:
-                        #parallel lines, can only intersect if l_b == s_b 
-                        #(meaning they are the same line), and have intersecting ranges 
-                        if l_b == s_b:
-                            if l_xmin <= max(s_x1, s_x2) and min(s_x1, s_x2) <= l_xmax:
-                                 #intersection found
-                                 crossings.append( ( (s_x1 + s_x2) / 2.0, (s_y1 + s_y2) / 2.0 ) )
-                        
-                    else:                        
-                        #not parallel, they must have an intersection point 
-                        x_int = (s_b - l_b) / (l_m - s_m)
-                        y_int = x_int * l_m + l_b
-                                                
-                        
-                        #the intersection point must be in both lines...                        
-                        if l_xmin <= x_int and x_int <= l_xmax and \
-                           min(s_x1, s_x2) <= x_int and x_int <= max(s_x1, s_x2):                            
-                            crossings.append( (x_int, y_int) )
-                                           
-        else:
-            #the given line is a vertical line...
+        active = (minX < l_xmax) & (maxX > l_xmin) & (minY < l_ymax) & (maxY > l_ymin)
+        #... and there are no crossings with lines that are a single point
+        active &= ~((l_x1 == l_x2) & (l_y1 == l_y2))
+
+        table = self.getSegmentTable()
+
+        #the lines are processed in two groups, non vertical and vertical lines
+        found_lines = []
+        found_x = []
+        found_y = []
+
+        #(values computed for vertical and parallel segments are invalid, but masked out)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            #non vertical lines...
+            idx = np.flatnonzero(active & (l_x1 != l_x2))
+            if idx.shape[0] > 0:
+                g_x1 = l_x1[idx, None]
+                g_xmin = l_xmin[idx, None]
+                g_xmax = l_xmax[idx, None]
+
+                #use the slope and intersect to compare...
+                l_m = (l_y2[idx, None] - l_y1[idx, None]) / (l_x2[idx, None] - g_x1)
+                l_b = l_y1[idx, None] - l_m * g_x1
+
+                #...the segment is a vertical line, inside the range of the current line...
+                y_int_v = table.x1 * l_m + l_b
+                found_v = (table.vertical & (g_xmin <= table.x1) & (table.x1 <= g_xmax) & 
+                           (table.ymin <= y_int_v) & (y_int_v <= table.ymax))
+
+                #...parallel lines, can only intersect if l_b == s_b 
+                #(meaning they are the same line), and have intersecting ranges 
+                parallel = ~table.vertical & (table.m == l_m)
+                found_p = parallel & (table.b == l_b) & (g_xmin <= table.xmax) & (table.xmin <= g_xmax)
+
+                #...not parallel, they must have an intersection point 
+                #   that must be in both lines...
+                x_int = (table.b - l_b) / (l_m - table.m)
+                y_int = x_int * l_m + l_b
+                found_c = (~table.vertical & ~parallel & (g_xmin <= x_int) & (x_int <= g_xmax) & 
+                           (table.xmin <= x_int) & (x_int <= table.xmax))
+
+                c_x = np.where(found_v, table.x1, np.where(found_p, table.mid_x, x_int))
+                c_y = np.where(found_v, y_int_v, np.where(found_p, table.mid_y, y_int))
+
+                rows, cols = np.nonzero(found_v | found_p | found_c)
+                found_lines.append(idx[rows])
+                found_x.append(c_x[rows, cols])
+                found_y.append(c_y[rows, cols])
+
+            #vertical lines...
             #can't use the slope, use a different method
-            #for every segment....
-            for i in range(len(self.points) - 1):
-                s_x1, s_y1 = self.points[i]
-                s_x2, s_y2 = self.points[i + 1]
-                
-                if s_x2 == s_x1:
-                    #the segment is a vertical line (too)...
-                    #only if they are on the same x position, and their range intersects
-                    if s_x1 == l_x1 and min(s_y1, s_y2) < l_ymax and l_ymin < max(s_y1, s_y2):
-                        crossings.append( ( (s_x1 + s_x2) / 2.0, (s_y1 + s_y2) / 2.0 ) )
-                else:
-                    #calculate intersection point
-                    if min(s_x1, s_x2) <= l_x1 and l_x1 <= max(s_x1, s_x2):
-                        #the vertical line is inside the range of the current segment...
-                        s_m = (s_y2 - s_y1) / (s_x2 - s_x1)
-                        s_b = s_y1 - s_m * s_x1
-                    
-                        y_int = l_x1  * s_m + s_b
-                        #check if y_int in range of vertical line...
-                        if l_ymin <= y_int and y_int <= l_ymax:
-                            #intersection found...
-                            crossings.append( ( l_x1 , y_int ) )
+            idx = np.flatnonzero(active & (l_x1 == l_x2))
+            if idx.shape[0] > 0:
+                g_x1 = l_x1[idx, None]
+                g_ymin = l_ymin[idx, None]
+                g_ymax = l_ymax[idx, None]
 
+                #...the segment is a vertical line (too)...
+                #only if they are on the same x position, and their range intersects
+                found_v = table.vertical & (table.x1 == g_x1) & (table.ymin < g_ymax) & (g_ymin < table.ymax)
 
-        return crossings
+                #...the vertical line is inside the range of the current segment...
+                y_int = g_x1 * table.m + table.b
+                found_c = (~table.vertical & (table.xmin <= g_x1) & (g_x1 <= table.xmax) & 
+                           (g_ymin <= y_int) & (y_int <= g_ymax))
+
+                c_x = np.where(found_v, table.mid_x, g_x1)
+                c_y = np.where(found_v, table.mid_y, y_int)
+
+                rows, cols = np.nonzero(found_v | found_c)
+                found_lines.append(idx[rows])
+                found_x.append(c_x[rows, cols])
+                found_y.append(c_y[rows, cols])
+
+        if len(found_lines) == 0:
+            empty = np.zeros(0, dtype=np.float64)
+            return np.zeros(0, dtype=np.int64), empty, empty
+
+        line_idx = np.concatenate(found_lines)
+        c_x = np.concatenate(found_x)
+        c_y = np.concatenate(found_y)
+
+        #sort by line (stable, keeps the order of the segments)
+        order = np.argsort(line_idx, kind='mergesort')
+
+        return line_idx[order], c_x[order], c_y[order]
         
     #Finds the point in the trace that is closest to the given point
     #then return the distance between that point and the given point
@@ -639,28 +765,11 @@ class TraceInfo:
 
     #Calculate the minimum distance betwen two given traces (For segmentation)
     def traceDistance(self, other_trace):
-        
-        closest_local = 0
-        closest_other = 0
-        
-        diff_x = self.sharp_points[0][1][0] - other_trace.sharp_points[0][1][0]
-        diff_y = self.sharp_points[0][1][1] - other_trace.sharp_points[0][1][1]
+        #difference between every pair of sharp points...
+        diff_x = self.sharp_points[:, 0].reshape((-1, 1)) - other_trace.sharp_points[:, 0].reshape((1, -1))
+        diff_y = self.sharp_points[:, 1].reshape((-1, 1)) - other_trace.sharp_points[:, 1].reshape((1, -1))
         #use square of distance...
-        closest_dist = diff_x * diff_x + diff_y * diff_y
-        
-        for i in range(len(self.sharp_points) ):
-            for j in range(len(other_trace.sharp_points) ):
-                diff_x = self.sharp_points[i][1][0] - other_trace.sharp_points[j][1][0]
-                diff_y = self.sharp_points[i][1][1] - other_trace.sharp_points[j][1][1]
-                #use square of distance...
-                dist = diff_x * diff_x + diff_y * diff_y
-                
-                if dist < closest_dist:
-                    #new closest found...
-                    closest_local = i
-                    closest_other = j
-                    
-                    closest_dist = dist
+        closest_dist = (diff_x * diff_x + diff_y * diff_y).min()
         
         return math.sqrt( closest_dist )
                 
@@ -669,281 +778,267 @@ class TraceInfo:
         #1) total angular change
         #2) normalized line length
         #3) total sharp points
-        totalAngularChange = 0.0
-        lineLength = 0.0                               
-        
         #get the sum of the angles of the smoothed curve...
-        previousAngle = None         
-        for i in range(len(self.points) - 1):
-            currentAngle = self.slopeAngle(self.points[i], self.points[i + 1])
-            lineLength += self.distance(i, i + 1)
-            
-            if previousAngle != None:
-                totalAngularChange += self.angularDifference(currentAngle, previousAngle)
-                 
-            previousAngle = currentAngle
-               
+        angles = self.segmentAngles()
+        turns = np.abs(angles[1:] - angles[:-1])
+        #circular ....
+        turns = np.where(turns > math.pi, math.pi * 2 - turns, turns)
+
+        totalAngularChange = float(turns.sum())
+        lineLength = float(self.segmentLengths().sum())
         
         return [ totalAngularChange, lineLength, float(len(self.sharp_points)) ]
         #return [ [totalAngularChange], [lineLength], float(len(self.sharp_points)) ]
         
     #Return the types of the general features 
-    def lineCumulativeFeaturesTypes(self):
+    @staticmethod
+    def lineCumulativeFeaturesTypes():
         # C = Continuous
         return ['C', 'C', 'C' ]
 
     #Get histograms of vertical and horizontal projections of the trace
     def getHistograms(self, bins):
-        #create empty bins
-        horizontal = [ 0 for x in range(bins)]
-        vertical = [ 0 for x in range(bins)]
+        #place the points in the bins...             
+        h_bins = TraceInfo.getHistogramBins(self.points[:, 0], bins)
+        v_bins = TraceInfo.getHistogramBins(self.points[:, 1], bins)
+
+        horizontal = np.bincount(h_bins, minlength=bins).tolist()
+        vertical = np.bincount(v_bins, minlength=bins).tolist()
             
+        return (horizontal, vertical)
+
+    #gets the bin of each value in [-1, 1] for an histogram with the given number of bins
+    @staticmethod
+    def getHistogramBins(values, bins):
         bin_size = 2.0 / (bins - 1)
         #the bins are located in a way that the bins at the extremes will be half outside
         start = -1.0 - bin_size * 0.5
-        #place the points in the bins...             
-        for x, y in self.points:
-            h_bin = int(math.floor((x - start) / bin_size ))
-            v_bin = int(math.floor((y - start) / bin_size ))
-            
-            horizontal[h_bin] += 1
-            vertical[v_bin] += 1
-            
-        return (horizontal, vertical)
+
+        return np.floor((values - start) / bin_size).astype(np.int64)
 
     #Get the 2D histogram of points of the trace
     def get2DHistogram(self, rows, cols):
         #create the bins...
-        distribution = [ [ 0 for x in range(cols) ] for y in range(rows) ]
-        
+        distribution = np.zeros(rows * cols, dtype=np.float64)
+
+        bins, weights = TraceInfo.getBilinearBins(self.points, rows, cols)
+
+        np.add.at(distribution, bins, weights)
+           
+        return distribution.reshape((rows, cols)).tolist()
+
+    #Gets the bins of a grid of rows x cols (as indices row * cols + col) 
+    #and the weights used to distribute each point between 4 bins (bilinear interpolation)
+    #(returns 4 bins and weights per point, in order of the points)
+    @staticmethod
+    def getBilinearBins(points, rows, cols):
         bin_size_x = 2.0 / (cols - 1)
         bin_size_y = 2.0 / (rows - 1)
         
-        for x, y in self.points:
-            h_div = (x + 1.0) / bin_size_x
-            h_bin0 = int(math.floor(h_div))
-            if h_bin0 == cols - 1:
-                h_bin0 = cols - 2
-                h_w1 = 1.0
-            else:
-                h_w1 = h_div - h_bin0
-            h_bin1 = h_bin0 + 1
-
-            v_div = (y + 1.0) / bin_size_y
-            v_bin0 = int(math.floor(v_div))
-            if v_bin0 == rows - 1:
-                v_bin0 = rows - 2
-                v_w1 = 1.0
-            else:
-                v_w1 = v_div - v_bin0
-            v_bin1 = v_bin0 + 1            
-            
-            distribution[v_bin0][h_bin0] += (1.0 - h_w1) * (1.0 - v_w1)
-            distribution[v_bin0][h_bin1] += h_w1 * (1.0 - v_w1)
-            distribution[v_bin1][h_bin0] += (1.0 - h_w1) * v_w1
-            distribution[v_bin1][h_bin1] += h_w1 * v_w1                            
-           
-        return distribution
+        h_div = (points[:, 0] + 1.0) / bin_size_x
+        h_bin0 = np.floor(h_div).astype(np.int64)
+        h_w1 = h_div - h_bin0
+        #points on the last column...
+        h_last = (h_bin0 == cols - 1)
+        h_bin0[h_last] = cols - 2
+        h_w1[h_last] = 1.0
+        h_bin1 = h_bin0 + 1
+
+        v_div = (points[:, 1] + 1.0) / bin_size_y
+        v_bin0 = np.floor(v_div).astype(np.int64)
+        v_w1 = v_div - v_bin0
+        #points on the last row...
+        v_last = (v_bin0 == rows - 1)
+        v_bin0[v_last] = rows - 2
+        v_w1[v_last] = 1.0
+        v_bin1 = v_bin0 + 1
+
+        #each point is distributed between 4 bins, (bilinear interpolation)
+        bins = np.column_stack((v_bin0 * cols + h_bin0, v_bin0 * cols + h_bin1, 
+                                v_bin1 * cols + h_bin0, v_bin1 * cols + h_bin1)).ravel()
+        weights = np.column_stack(((1.0 - h_w1) * (1.0 - v_w1), h_w1 * (1.0 - v_w1),
+                                   (1.0 - h_w1) * v_w1, h_w1 * v_w1)).ravel()
+
+        return bins, weights
 
     #Get the histogram of slope orientations
     def getGabor(self, rows, cols):
         #           ....  0    45  90   135
-        distribution = [ 0.0, 0.0, 0.0, 0.0 ] * (rows * cols)
+        distribution = np.zeros(4 * rows * cols, dtype=np.float64)
 
         # The total length is required for weighting...
-        lineLength = 0.0
-        distances = []
-        mid_points = []
-        for i in range(len(self.points) - 1):            
-            mid_x = (self.points[i][0] + self.points[i + 1][0]) / 2
-            mid_y = (self.points[i][1] + self.points[i + 1][1]) / 2
-            
-            mid_points.append( ( mid_x, mid_y ) )
-            distances.append( self.distance(i, i + 1) )
-            
-            lineLength += distances[i]
+        mid_points = (self.points[:-1] + self.points[1:]) / 2
+        distances = self.segmentLengths()
+        lineLength = float(distances.sum())
+
+        if len(distances) == 0:
+            return distribution.tolist(), lineLength
+
+        #relative weight according to length in relation to total...
+        wl = distances / lineLength
+
+        indices, values = TraceInfo.getOrientationBins(mid_points, self.segmentAngles(), wl, rows, cols)
 
+        #add to corresponding bins, segment by segment...
+        np.add.at(distribution, indices, values)
+        
+        return distribution.tolist(), lineLength
+
+    #Gets the bins of the histogram of slope orientations (as indices cell * 4 + orientation)
+    #and the values added to them by a set of segments, given their mid points, angles
+    #and weights. (returns 8, 4 or 2 bins and values per segment, in order of the segments)
+    @staticmethod
+    def getOrientationBins(mid_points, angles, wl, rows, cols):
         # Now calculate the angles...
         pi4 = math.pi / 4
         #off = (math.pi * 9) / 8
         off = math.pi
-        
-        for i in range(len(self.points) - 1):
-            #relative weight according to length in relation to total...
-            wl = distances[i] / lineLength
 
-            #use midpoint of the line to distribute values on the corresponding cells of the grid
-            mid_x, mid_y = mid_points[i]
-            
-            if rows >= 2:
-                #....for Y....
-                val_y = ((mid_y + 1.0) / 2.0) * (rows - 1)
-                c0_y = int(val_y)
-                if c0_y == rows - 1:
-                    c0_y -= 1                
-                c1_y = c0_y + 1
-                w1_y = val_y - c0_y
-                w0_y = 1 - w1_y
-                
-            if cols >= 2:
-                #....for X....
-                val_x = ((mid_x + 1.0) / 2.0) * (cols - 1)
-                c0_x = int(val_x)
-                if c0_x == cols - 1:
-                    c0_x -= 1                
-                c1_x = c0_x + 1
-                w1_x = val_x - c0_x
-                w0_x = 1 - w1_x
-                
-            #angle of current segment of line...
-            currentAngle = self.slopeAngle(self.points[i], self.points[i + 1])
-
-            #angle is between -pi and pi, add offset and divide between pi / 4
-            p = (currentAngle + off) / pi4
-            #the base orientation
-            fp = math.floor( p )
-            #the weight of the second orientation
-            wp1 = p - fp
-            #select bin for current orientation
-            p0 = int(fp % 4)
-            #select bin for next orientation (circular)
-            p1 = int((p0 + 1) % 4)
-
-            #the values....
-            g0 = wl * (1.0 - wp1)
-            g1 = wl * (wp1)
-
-            #add to corresponding bins...
-            if rows >= 2 and cols >= 2:
-                #16 or more values ... (4 cells affected, 8 bins)
-                #(0,0)
-                distribution[(c0_y *  cols + c0_x) * 4 + p0] += g0 * w0_x * w0_y
-                distribution[(c0_y *  cols + c0_x) * 4 + p1] += g1 * w0_x * w0_y
-                #(0,1)
-                distribution[(c1_y *  cols + c0_x) * 4 + p0] += g0 * w0_x * w1_y
-                distribution[(c1_y *  cols + c0_x) * 4 + p1] += g1 * w0_x * w1_y
-                #(1,0)
-                distribution[(c0_y *  cols + c1_x) * 4 + p0] += g0 * w1_x * w0_y
-                distribution[(c0_y *  cols + c1_x) * 4 + p1] += g1 * w1_x * w0_y
-                #(1,1)
-                distribution[(c1_y *  cols + c1_x) * 4 + p0] += g0 * w1_x * w1_y
-                distribution[(c1_y *  cols + c1_x) * 4 + p1] += g1 * w1_x * w1_y
-            elif rows >= 2:
-                #8 or more values ... (2 cells affected, 4 bins)
-                #(0,0)
-                distribution[c0_y * 4 + p0] += g0 * w0_y
-                distribution[c0_y * 4 + p1] += g1 * w0_y
-                #(0,1)
-                distribution[c1_y * 4 + p0] += g0 * w1_y
-                distribution[c1_y * 4 + p1] += g1 * w1_y
-            elif cols >= 2:
-                #8 or more values ... (2 cells affected, bins)
-                #(0,0)
-                distribution[c0_x * 4 + p0] += g0 * w0_x
-                distribution[c0_x * 4 + p1] += g1 * w0_x
-                #(1,0)
-                distribution[c1_x * 4 + p0] += g0 * w1_x
-                distribution[c1_x * 4 + p1] += g1 * w1_x
-            else:
-                #only 4 values.... (1 cell affected, 2 bins)
-                distribution[p0] += g0
-                distribution[p1] += g1
-        
-        return distribution, lineLength
+        #use midpoint of the line to distribute values on the corresponding cells of the grid
+        if rows >= 2:
+            #....for Y....
+            val_y = ((mid_points[:, 1] + 1.0) / 2.0) * (rows - 1)
+            c0_y = val_y.astype(np.int64)
+            c0_y[c0_y == rows - 1] -= 1
+            c1_y = c0_y + 1
+            w1_y = val_y - c0_y
+            w0_y = 1 - w1_y
+
+        if cols >= 2:
+            #....for X....
+            val_x = ((mid_points[:, 0] + 1.0) / 2.0) * (cols - 1)
+            c0_x = val_x.astype(np.int64)
+            c0_x[c0_x == cols - 1] -= 1
+            c1_x = c0_x + 1
+            w1_x = val_x - c0_x
+            w0_x = 1 - w1_x
+
+        #angle of each segment of line...
+        #angle is between -pi and pi, add offset and divide between pi / 4
+        p = (angles + off) / pi4
+        #the base orientation
+        fp = np.floor( p )
+        #the weight of the second orientation
+        wp1 = p - fp
+        #select bin for current orientation
+        p0 = np.mod(fp, 4).astype(np.int64)
+        #select bin for next orientation (circular)
+        p1 = (p0 + 1) % 4
+
+        #the values....
+        g0 = wl * (1.0 - wp1)
+        g1 = wl * (wp1)
+
+        #cells affected by each segment, and values for both orientations on each cell
+        if rows >= 2 and cols >= 2:
+            #16 or more values ... (4 cells affected, 8 bins)
+            cells = [ c0_y * cols + c0_x, c1_y * cols + c0_x, c0_y * cols + c1_x, c1_y * cols + c1_x ]
+            values = [ g0 * w0_x * w0_y, g1 * w0_x * w0_y,
+                       g0 * w0_x * w1_y, g1 * w0_x * w1_y,
+                       g0 * w1_x * w0_y, g1 * w1_x * w0_y,
+                       g0 * w1_x * w1_y, g1 * w1_x * w1_y ]
+        elif rows >= 2:
+            #8 or more values ... (2 cells affected, 4 bins)
+            cells = [ c0_y, c1_y ]
+            values = [ g0 * w0_y, g1 * w0_y, g0 * w1_y, g1 * w1_y ]
+        elif cols >= 2:
+            #8 or more values ... (2 cells affected, bins)
+            cells = [ c0_x, c1_x ]
+            values = [ g0 * w0_x, g1 * w0_x, g0 * w1_x, g1 * w1_x ]
+        else:
+            #only 4 values.... (1 cell affected, 2 bins)
+            cells = [ 0 ]
+            values = [ g0, g1 ]
+
+        indices = []
+        for cell in cells:
+            indices.append( cell * 4 + p0 )
+            indices.append( cell * 4 + p1 )
+
+        return np.column_stack(indices).ravel(), np.column_stack(values).ravel()
 
     #Calculates feature based on estimation fo the types of line segments
     #of the trace
     def getTypeSubsegmentsInfo(self):
         #Get the angular difference between each pair of neighbor lines...
-        slopes = []
-        angles = []
-        lengths = []
-        
-        for i in range(len(self.points) - 1):
-            slopes.append( self.slopeAngle(self.points[i], self.points[i + 1]) )
-            lengths.append( self.distance(i, i + 1) )
-            
-            if len(slopes) > 1:                
-                angles.append( self.signedAngularDifference(slopes[-1], slopes[-2]) )
-        
+        diff = self.points[1:] - self.points[:-1]
+        slopes = np.arctan2(diff[:, 1], diff[:, 0])
+        lengths = [ math.sqrt(math.pow(x, 2) + math.pow(y, 2)) for x, y in diff.tolist() ]
+
+        #(signed difference between each slope and the previous one)
+        alpha = slopes[1:]
+        beta = slopes[:-1]
+        turns = alpha - beta
+        turns = np.where(turns > math.pi, alpha - (beta + math.pi * 2), turns)
+        turns = np.where(turns < -math.pi, (alpha + math.pi * 2) - beta, turns)
+        angles = turns.tolist()
+        abs_angles = np.abs(turns).tolist()
+
         #initially, all segments are individual subsegments (and curve)
-        self.segments = [ (x, x + 1, 0, 2, lengths[x]) for x in range(len(self.points) - 1) ]        
-                 
         #then, use this angle difference to group possible straight lines...
-        pos = 0
+        #(each pass reads the segments of the previous one, and merges
+        # the next segment with the last one added when required)
         threshold = math.pi * 0.0125
-        
+        segments = []
+        if len(lengths) > 0:
+            segments.append( (0, 1, 0, 2, lengths[0]) )
+
         for i in range(len(angles)):
-            init, end, ang, stype, l1 = self.segments[pos]
+            init, end, ang, stype, l1 = segments[-1]
 
             new_ang = ang + angles[i]
             if -threshold < new_ang and new_ang < threshold:
-                init2, end2, ang2, stype2, l2 = self.segments[pos + 1]
-                
                 #segment added to the previous...
                 #... also, set as straight line
-                self.segments[pos] = (init, end2, new_ang, 1, l1 + l2)
-                
-                #erase current segment..
-                del self.segments[pos + 1]
+                segments[-1] = (init, i + 2, new_ang, 1, l1 + lengths[i + 1])
             else:
                 #start a new segment
-                pos += 1
+                segments.append( (i + 1, i + 2, 0, 2, lengths[i + 1]) )
 
         #now, check for contiguous "curve segments" and merge them
-        pos = 0
-        while pos < len(self.segments) - 1:
-            init, end, ang, stype, l1 = self.segments[pos]
-
-            if stype == 2:
-                #curve, check next one ...
-                init2, end2, ang2, stype2, l2 = self.segments[pos + 1]
-                if stype2 == 2:
-                     #merge...
-                     self.segments[pos] = (init, end2, ang + abs(angles[init2-1]), 2, l1 + l2)
-                     #delete
-                     del self.segments[pos + 1]
-                else:
-                    pos += 1
+        merged = segments[:1]
+        for init2, end2, ang2, stype2, l2 in segments[1:]:
+            init, end, ang, stype, l1 = merged[-1]
+
+            if stype == 2 and stype2 == 2:
+                merged[-1] = (init, end2, ang + abs_angles[init2 - 1], 2, l1 + l2)
             else:
-                pos += 1
+                merged.append( (init2, end2, ang2, stype2, l2) )
+        segments = merged
 
         #check for broken straight lines...
-        pos = 0
-        while pos < len(self.segments) - 1:
-            init1, end1, ang1, stype1, l1 = self.segments[pos]
-            init2, end2, ang2, stype2, l2 = self.segments[pos + 1]
+        merged = segments[:1]
+        for init2, end2, ang2, stype2, l2 in segments[1:]:
+            init1, end1, ang1, stype1, l1 = merged[-1]
 
             if stype1 == 1 and stype2 == 1 and angles[init2 - 1] < math.pi * 0.025:
-                self.segments[pos] = (init1, end2, ang1 + ang2, 1, l1 + l2)
-
-                del self.segments[pos + 1]
+                merged[-1] = (init1, end2, ang1 + ang2, 1, l1 + l2)
             else:
-                pos += 1
-        
+                merged.append( (init2, end2, ang2, stype2, l2) )
+        segments = merged
+
         #additional check for small "Straight lines" between curves
         #should be a single curve segment
-        pos = 0
-        while pos < len(self.segments) - 2:
-            init1, end1, ang1, stype1, l1 = self.segments[pos]
-            init2, end2, ang2, stype2, l2 = self.segments[pos + 1]
-            init3, end3, ang3, stype3, l3 = self.segments[pos + 2]
+        merged = segments[:1]
+        pos = 1
+        while pos < len(segments) - 1:
+            init1, end1, ang1, stype1, l1 = merged[-1]
+            init2, end2, ang2, stype2, l2 = segments[pos]
+            init3, end3, ang3, stype3, l3 = segments[pos + 1]
 
             if (stype1 == 2 and stype2 == 1 and stype3 == 2) \
                 and (((l2 < l1 or l2 < l3) and (end2 - init2) <= 4) or (abs(ang2) > 0.1)):
                 
                 #small straight segment between two curve segments, join as a single curve segment
+                inner_ang = sum(abs_angles[init2 - 1:init3], 0.0)
 
-                inner_ang = 0.0
-                for i in range(init2, init3 + 1):
-                    inner_ang += abs(angles[i - 1])
-                    
-                self.segments[pos] = (init1, end3, ang1 + inner_ang + ang3, 2, l1 + l2 + l3)
-
-                del self.segments[pos + 2]
-                del self.segments[pos + 1]
+                merged[-1] = (init1, end3, ang1 + inner_ang + ang3, 2, l1 + l2 + l3)
+                pos += 2
             else:
+                merged.append( segments[pos] )
                 pos += 1
+        merged += segments[pos:]
+        self.segments = merged
 
         #now, do anylisis of segments
         length_curves = 0.0
@@ -957,61 +1052,47 @@ class TraceInfo:
                 #curve line
                 length_curves += l
 
-        total_length = length_straight + length_curves
-
         # Now calculate the angles...
         pi4 = math.pi / 4
         off = math.pi
 
-        distribution_str = [[ 0.0 for x in range(4) ] for y in range(4)]
         distribution_crv = [ 0.0 ] * 4
         distribution_arc = [ 0.0 ] * 4
-        
-        for init in range(len(self.points) - 1):
-            p = (slopes[init] + off) / pi4
-            l = lengths[init]
-            
-            #the base orientation
-            fp = math.floor( p )
 
-            #the weight of the second orientation
-            wp1 = p - fp
+        p = (slopes + off) / pi4
 
-            #select bin for current orientation
-            p0 = int(fp % 4)
-            #select bin for next orientation (circular)
-            p1 = int((p0 + 1) % 4)
+        #the base orientation
+        fp = np.floor( p )
 
-            #the values....
-            g0 = l * (1.0 - wp1)
-            g1 = l * (wp1)
+        #the weight of the second orientation
+        wp1 = p - fp
 
-            x, y = self.points[init]
+        #select bin for current orientation
+        p0 = np.mod(fp, 4).astype(np.int64)
+        #select bin for next orientation (circular)
+        p1 = (p0 + 1) % 4
 
-            w_right = (x + 1.0) / 2.0
-            w_bottom = (y + 1.0) / 2.0
+        #the values....
+        l = np.array(lengths, dtype=np.float64)
+        g0 = l * (1.0 - wp1)
+        g1 = l * (wp1)
 
-            #top-bottom
-            #0 top, 1 bottom                
-            distribution_str[0][p0] += g0 * (1.0 - w_bottom)
-            distribution_str[1][p0] += g0 * (w_bottom)
+        w_right = (self.points[:-1, 0] + 1.0) / 2.0
+        w_bottom = (self.points[:-1, 1] + 1.0) / 2.0
 
-            distribution_str[0][p1] += g1 * (1.0 - w_bottom)
-            distribution_str[1][p1] += g1 * (w_bottom)
+        #top-bottom (rows 0 top, 1 bottom) and left-right (rows 2 left, 3 right)
+        #of a 4 x 4 distribution, 8 values per segment (accumulated in order of the segments)
+        bins = np.column_stack((p0, 4 + p0, p1, 4 + p1, 8 + p0, 12 + p0, 8 + p1, 12 + p1)).ravel()
+        values = np.column_stack((g0 * (1.0 - w_bottom), g0 * (w_bottom), g1 * (1.0 - w_bottom), g1 * (w_bottom),
+                                  g0 * (1.0 - w_right), g0 * w_right, g1 * (1.0 - w_right), g1 * w_right)).ravel()
 
-            #2 left, 3 right
-            distribution_str[2][p0] += g0 * (1.0 - w_right)
-            distribution_str[3][p0] += g0 * w_right
-
-            distribution_str[2][p1] += g1 * (1.0 - w_right)
-            distribution_str[3][p1] += g1 * w_right
-
-            
+        distribution_str = np.bincount(bins, weights=values, minlength=16).reshape((4, 4)).tolist()
         
         return (length_straight, length_curves, distribution_str, distribution_crv, distribution_arc)
 
     #Get the types og the subsegments feature
-    def getSubsegmentsFeaturesTypes(self):
+    @staticmethod
+    def getSubsegmentsFeaturesTypes():
         # % of straight line
         # lenght straight
         # lenght curve
@@ -1042,3 +1123,113 @@ class TraceInfo:
 
         return (ux, uy, 1.0)
     
+
+
+#=====================================================================
+#  Table of the line segments between consecutive points of a trace,
+#  with their limits, slopes and intersects computed once to answer 
+#  crossing queries in batch (see TraceInfo.getCrossingsArrays)
+#
+#=====================================================================
+
+class SegmentTable(object):
+    __slots__ = ['points', 'x1', 'y1', 'x2', 'y2', 'xmin', 'xmax', 'ymin', 'ymax', 
+                 'mid_x', 'mid_y', 'vertical', 'm', 'b']
+
+    def __init__(self, points):
+        #the points used to build the table
+        self.points = points
+
+        #end points of each segment
+        self.x1 = points[:-1, 0]
+        self.y1 = points[:-1, 1]
+        self.x2 = points[1:, 0]
+        self.y2 = points[1:, 1]
+
+        #bounding interval of each segment
+        self.xmin = np.minimum(self.x1, self.x2)
+        self.xmax = np.maximum(self.x1, self.x2)
+        self.ymin = np.minimum(self.y1, self.y2)
+        self.ymax = np.maximum(self.y1, self.y2)
+
+        #middle point of each segment
+        self.mid_x = (self.x1 + self.x2) / 2.0
+        self.mid_y = (self.y1 + self.y2) / 2.0
+
+        #segments which are vertical lines...
+        self.vertical = (self.x2 == self.x1)
+
+        #the slope and intersect of every segment (invalid for vertical segments)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.m = (self.y2 - self.y1) / (self.x2 - self.x1)
+            self.b = self.y1 - self.m * self.x1
+
+
+#=====================================================================
+#  Pre-processing pipeline shared by all the tools that create traces
+#  from raw points (data loading, distortion and classification).
+#
+#  The time spent on each stage is accumulated in preprocessing_times
+#  (in seconds), and the number of traces processed is counted in
+#  preprocessing_times["traces"]
+#
+#=====================================================================
+
+PreprocessingStages = ["duplicates", "missing_points", "smoothing", "final_duplicates"]
+
+preprocessing_times = {}
+
+def reset_preprocessing_times():
+    preprocessing_times["traces"] = 0
+    for stage in PreprocessingStages:
+        preprocessing_times[stage] = 0.0
+
+reset_preprocessing_times()
+
+#creates a trace from the raw points and applies the general trace pre processing...
+#if given, stage_callback(stage, trace) is called after each stage (for debugging)
+def preprocess_trace(trace_id, trace_points, stage_callback=None):
+    start = time.time()
+
+    trace = TraceInfo(trace_id, trace_points)
+
+    #1) first step of pre processing: Remove duplicated points
+    trace.removeDuplicatedPoints()
+
+    end = time.time()
+    preprocessing_times["duplicates"] += end - start
+    if stage_callback is not None:
+        stage_callback("duplicates", trace)
+
+    #2) Add points to the trace...
+    start = time.time()
+    trace.addMissingPoints()
+
+    end = time.time()
+    preprocessing_times["missing_points"] += end - start
+    if stage_callback is not None:
+        stage_callback("missing_points", trace)
+
+    #3) Apply smoothing to the trace...
+    start = time.time()
+    trace.applySmoothing()
+
+    end = time.time()
+    preprocessing_times["smoothing"] += end - start
+    if stage_callback is not None:
+        stage_callback("smoothing", trace)
+
+    #4) it should not ... but .....
+    start = time.time()
+    if trace.hasDuplicatedPoints():
+        #...remove them! ....
+        trace.removeDuplicatedPoints()
+
+    end = time.time()
+    preprocessing_times["final_duplicates"] += end - start
+    if stage_callback is not None:
+        stage_callback("final_duplicates", trace)
+
+    preprocessing_times["traces"] += 1
+
+    return trace
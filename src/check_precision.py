@@ -0,0 +1,192 @@
+"""
+    DPRL Math Symbol Recognizers 
+    Copyright (c) 2012-2014 Kenny Davila, Richard Zanibbi
+
+    This file is part of DPRL Math Symbol Recognizers.
+
+    DPRL Math Symbol Recognizers is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DPRL Math Symbol Recognizers is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with DPRL Math Symbol Recognizers.  If not, see <http://www.gnu.org/licenses/>.
+
+    Contact:
+        - Kenny Davila: kxd7282@rit.edu
+        - Richard Zanibbi: rlaz@cs.rit.edu 
+"""
+import os
+import sys
+import fnmatch
+import numpy as np
+from traceInfo import *
+from mathSymbol import *
+from load_inkml import *
+from dataset_ops import *
+
+#=====================================================================
+#  Compares the features of the symbols found in a directory of inkml
+#  files stored in single precision (float32) against the ones stored
+#  in double precision (float64), before and after normalization.
+#  Optionally, compares the accuracy of the same classifier trained
+#  and tested with the features stored in each precision
+#
+#=====================================================================
+
+#parameters of the random forest used to compare accuracies (the random 
+#seed is fixed, so both precisions train exactly the same forest)
+ForestTrees = 50
+ForestMaxDepth = 40
+ForestSeed = 0
+
+#loads all the symbols of the inkml files in a directory (None if the path is invalid)
+def load_symbols(inkml_path, max_files):
+    #load and filter the list of files, the result is a list of inkml files only
+    try:
+        filtered_list = sorted(fnmatch.filter(os.listdir(inkml_path), '*.inkml'))
+    except:
+        print( "The inkml path <" + inkml_path + "> is invalid!" )
+        return None
+
+    if max_files is not None:
+        filtered_list = filtered_list[:max_files]
+
+    symbols = []
+    for file_name in filtered_list:
+        file_path = os.path.join(inkml_path, file_name)
+        try:
+            symbols += load_inkml( file_path, True )
+        except:
+            print("Failed processing: " + file_path)
+
+    return symbols
+
+#Trains a random forest with the features of the training symbols stored in
+#the given precision (normalized), and returns its predictions for the testing symbols
+def train_and_predict(training, labels, testing, dtype):
+    from sklearn.ensemble import RandomForestClassifier
+
+    training_data, params = normalize_data(extract_features_batch(training, dtype=dtype))
+    testing_data = normalize_data_from_params(extract_features_batch(testing, dtype=dtype), params)
+
+    forest = RandomForestClassifier(n_estimators=ForestTrees, max_depth=ForestMaxDepth,
+                                    random_state=ForestSeed)
+    forest.fit(training_data, np.ravel(labels))
+
+    return forest.predict(testing_data)
+
+#compares the accuracy of the same random forest trained and tested in each precision
+def compare_accuracy(training, testing):
+    classes_dict, classes_l = get_label_mapping([ symbol.truth for symbol in training ])
+
+    #only testing symbols of classes found in training...
+    valid_testing = [ symbol for symbol in testing if symbol.truth in classes_dict ]
+    if len(valid_testing) == 0:
+        print("No testing symbols of the training classes found")
+        return
+
+    labels_train = get_mapped_labels([ symbol.truth for symbol in training ], classes_dict)
+    labels_test = np.ravel(get_mapped_labels([ symbol.truth for symbol in valid_testing ], classes_dict))
+
+    predicted_64 = train_and_predict(training, labels_train, valid_testing, np.float64)
+    predicted_32 = train_and_predict(training, labels_train, valid_testing, np.float32)
+
+    n_testing = len(valid_testing)
+    accuracy_64 = (np.count_nonzero(predicted_64 == labels_test) * 100.0) / n_testing
+    accuracy_32 = (np.count_nonzero(predicted_32 == labels_test) * 100.0) / n_testing
+    n_different = np.count_nonzero(predicted_64 != predicted_32)
+
+    print("")
+    print("Random forest: " + str(ForestTrees) + " trees, max depth " + str(ForestMaxDepth) + 
+          ", seed " + str(ForestSeed))
+    print("Training symbols: " + str(len(training)) + " (" + str(len(classes_l)) + " classes)")
+    print("Testing symbols: " + str(n_testing) + " (" + str(len(testing) - n_testing) + 
+          " skipped, classes not in training)")
+    print("Accuracy (float64): {:.3f}%".format(accuracy_64))
+    print("Accuracy (float32): {:.3f}%".format(accuracy_32))
+    print("Accuracy difference: {:.3f}%".format(accuracy_32 - accuracy_64))
+    print("Different predictions: " + str(n_different) + " of " + str(n_testing))
+
+def main():
+    #usage check
+    if len(sys.argv) < 2 or len(sys.argv) > 4:
+        print("Usage: python check_precision.py inkml_path [max_files] [testing_path]")
+        print("Where")
+        print("\tinkml_path\t= Path to directory that contains the inkml files")
+        print("\tmax_files\t= Optional, maximum number of files to process (per path, 0 = all)")
+        print("\ttesting_path\t= Optional, path to directory with the inkml files used to test the accuracy")
+        print("\t\t\t  of a classifier trained with the files of inkml_path in each precision")
+        return
+
+    if len(sys.argv) >= 3:
+        try:
+            max_files = int(sys.argv[2])
+        except:
+            print("Invalid max_files value")
+            return
+
+        if max_files <= 0:
+            max_files = None
+    else:
+        max_files = None
+
+    if len(sys.argv) >= 4:
+        testing_path = sys.argv[3]
+    else:
+        testing_path = None
+
+    symbols = load_symbols(sys.argv[1], max_files)
+    if symbols is None:
+        return
+
+    if len(symbols) == 0:
+        print("No symbols found")
+        return
+
+    print("Total symbols: " + str(len(symbols)))
+
+    #the same features in both precisions...
+    features_64 = extract_features_batch(symbols, dtype=np.float64)
+    features_32 = extract_features_batch(symbols, dtype=np.float32)
+
+    #...and normalized (each one on its own precision)
+    scaled_64, params_64 = normalize_data(features_64)
+    scaled_32, params_32 = normalize_data(features_32)
+
+    raw_diff = np.abs(features_32.astype(np.float64) - features_64)
+    raw_scale = np.maximum(np.abs(features_64), np.finfo(np.float32).tiny)
+    scaled_diff = np.abs(scaled_32.astype(np.float64) - scaled_64)
+
+    print("")
+    print("{:<28} {:>6} {:>14} {:>14} {:>14}".format("Family", "Dims", "Max abs. diff", "Max rel. diff",
+                                                     "Max norm. diff"))
+    plan = MathSymbol.getFeaturePlan()
+    start = 0
+    for family, size in plan.getFamilies():
+        end = start + size
+        print("{:<28} {:>6} {:>14.3e} {:>14.3e} {:>14.3e}".format(family, size, raw_diff[:, start:end].max(),
+                                                               (raw_diff[:, start:end] / raw_scale[:, start:end]).max(),
+                                                               scaled_diff[:, start:end].max()))
+        start = end
+
+    print("{:<28} {:>6} {:>14.3e} {:>14.3e} {:>14.3e}".format("All", plan.size, raw_diff.max(),
+                                                           (raw_diff / raw_scale).max(), scaled_diff.max()))
+
+    print("")
+    print("Memory used by features (float64): " + str(features_64.nbytes) + " bytes")
+    print("Memory used by features (float32): " + str(features_32.nbytes) + " bytes")
+
+    if testing_path is not None:
+        testing = load_symbols(testing_path, max_files)
+        if testing is None:
+            return
+
+        compare_accuracy(symbols, testing)
+
+main()
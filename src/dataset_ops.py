@@ -47,8 +47,10 @@ import numpy as np
 #   returns
 #     Samples, Labels, Att Types
 #     (NP Matrix, List, NP Matrix)
+#   (samples are stored using the given dtype,
+#    np.float32 uses half of the memory)
 #=========================================
-def load_dataset(file_name):
+def load_dataset(file_name, dtype=np.float64):
     try:
         
         data_file = open(file_name, 'r')
@@ -70,7 +72,7 @@ def load_dataset(file_name):
                 att_types[i] = 1
 
         estimated_samples = len(lines) - 1
-        tempo_samples = np.zeros( (estimated_samples, n_atts), dtype = np.float64 )
+        tempo_samples = np.zeros( (estimated_samples, n_atts), dtype = dtype )
 
         count_samples = 0
         labels_l = []
@@ -314,16 +316,19 @@ def load_label_mapping(file_name):
 
 
 def append_symbols(symbols, out_file):
+    #(imported here, the other functions do not need the features modules)
+    from mathSymbol import extract_features_batch
+
     n_samples = len(symbols)
 
     print("...adding samples " + str(n_samples) + " to output file...")
 
-    n_atts = 0
+    features = extract_features_batch(symbols)
+    n_atts = features.shape[1] if n_samples > 0 else 0
+
     content = ''
-    for idx, symbol in enumerate(symbols):
-        sample = symbol.getFeatures() + [ symbol.truth ]
-        if idx == 0:
-            n_atts = len(sample) - 1
+    for idx, sample_features in enumerate(features.tolist()):
+        sample = sample_features + [ symbols[idx].truth ]
 
         line = ''
         for i, v in enumerate(sample):
@@ -478,7 +483,7 @@ def normalize_data(data):
     params = []
     n_samples = np.size(data,0)
     n_atts = np.size(data, 1)
-    new_data = np.zeros((n_samples, n_atts))
+    new_data = np.zeros((n_samples, n_atts), dtype=data.dtype)
 
     #for each attribute...
     for att in range(n_atts):
@@ -507,7 +512,7 @@ def normalize_data(data):
 def normalize_data_from_params(data, params):
     n_samples = np.size(data,0)
     n_atts = np.size(data, 1)
-    new_data = np.zeros((n_samples, n_atts))
+    new_data = np.zeros((n_samples, n_atts), dtype=data.dtype)
 
     #for each attribute...
     for att in range(n_atts):
@@ -152,23 +152,10 @@ class Distorter:
         #create distorted traces...
         all_traces = []
         for t in symbol.traces:
-            new_points = self.distortPoints(t.original_points, max_diagonal)
-
-            new_trace = TraceInfo(t.id, new_points)
+            new_points = self.distortPoints(t.getOriginalPoints(), max_diagonal)
 
             #try smoothing the distorted version...
-            new_trace.removeDuplicatedPoints()
-
-            #Add points to the trace...
-            new_trace.addMissingPoints()
-
-            #Apply smoothing to the trace...
-            new_trace.applySmoothing()
-
-            #it should not ... but .....
-            if new_trace.hasDuplicatedPoints():
-                #...remove them! ....
-                new_trace.removeDuplicatedPoints()
+            new_trace = preprocess_trace(t.id, new_points)
 
             all_traces.append(new_trace)
 
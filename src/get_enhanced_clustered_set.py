@@ -83,33 +83,29 @@ def replace_labels(labels):
     return new_labels
 
 
-def get_symbol_features(symbols, n_atts, verbose):
+def get_symbol_features(symbols, n_atts, verbose, dtype=np.float64):
     if verbose:
         print("...Getting features for samples....")
 
     #...get features....
-    total_extra = len(symbols)
-    extra_features = np.zeros((total_extra, n_atts))
-
-    for idx, symbol in enumerate(symbols):
-        features = symbol.getFeatures()
+    if verbose:
+        extra_features = extract_features_batch(symbols, progress_callback=print_progress, dtype=dtype)
+    else:
+        extra_features = extract_features_batch(symbols, dtype=dtype)
 
-        #copy features from list to numpy array
-        for k in range(n_atts):
-            extra_features[idx, k] = features[k]
+    return extra_features[:, :n_atts]
 
-        #...some output....
-        if verbose and (idx == total_extra - 1 or idx % 10 == 0):
-            print_overwrite("...Processed " + str(idx + 1) + " of " + str(total_extra))
 
-    return extra_features
+def print_progress(done, total):
+    if done == total or (done - 1) % 10 == 0:
+        print_overwrite("...Processed " + str(done) + " of " + str(total))
 
 
 def main():
     #usage check
     if len(sys.argv) < 7:
         print("Usage: python get_enhanced_clustered_set.py inkml_path output min_prc diag_dist max_clusters " +
-              "clust_prc [verbose] [count_only]")
+              "clust_prc [verbose] [count_only] [lean_memory] [single_precision]")
         print("Where")
         print("\tinkml_path\t= Path to directory that contains the inkml files")
         print("\toutput\t\t= File name of the output file")
@@ -119,6 +115,8 @@ def main():
         print("\tclust_prc\t= Minimum cluster size based on (%) of largest ")
         print("\tverbose\t= Optional, print detailed messages ")
         print("\tcount_only\t= Will only count what will be the final size of dataset")
+        print("\tlean_memory\t= Optional, keep original points in single precision to reduce memory")
+        print("\tsingle_precision\t= Optional, keep features in single precision (float32) to reduce memory")
         return
 
     #load and filter the list of files, the result is a list of inkml files only
@@ -189,6 +187,34 @@ def main():
         #by default...
         count_only = False
 
+    if len(sys.argv) > 9:
+        try:
+            lean_memory = int(sys.argv[9]) > 0
+        except:
+            print("Invalid value for lean_memory")
+            return
+    else:
+        #by default...
+        lean_memory = False
+
+    #original points are only used to create the distorted samples
+    TraceInfo.compactOriginalPoints = lean_memory
+
+    if len(sys.argv) > 10:
+        try:
+            single_precision = int(sys.argv[10]) > 0
+        except:
+            print("Invalid value for single_precision")
+            return
+    else:
+        #by default...
+        single_precision = False
+
+    if single_precision:
+        features_dtype = np.float32
+    else:
+        features_dtype = np.float64
+
     #....read every inkml file in the path specified...
     #....create the initial symbol objects...
     all_symbols = []
@@ -214,42 +240,26 @@ def main():
 
     #...get features of original training set...
     print("Getting features of base training set...")
-    training = None
-    labels_l = None
-    att_types = None
     n_original_samples = len(all_symbols)
-    for idx, symbol in enumerate(all_symbols):
-        features = symbol.getFeatures()
-
-        if idx == 0:
-            #...create training set ....
-
-            #...first, the feature types...
-            n_atts = len(features)
-            feature_types = symbol.getFeaturesTypes()
-            att_types = np.zeros((n_atts, 1), dtype=np.int32)
-            for i in xrange(n_atts):
-                if feature_types[i] == 'D':
-                    att_types[i] = 2
-                else:
-                    att_types[i] = 1
 
-            #...for labels...
-            labels_l = []
-
-            #...finally, the matrix for training set itself...
-            training = np.zeros((n_original_samples, n_atts))
-
-        #copy features from list to numpy array
-        for k in range(n_atts):
-            training[idx, k] = features[k]
-
-        #copy label
-        labels_l.append(symbol.truth)
+    #...create training set ....
+    if verbose:
+        training = extract_features_batch(all_symbols, progress_callback=print_progress, dtype=features_dtype)
+    else:
+        training = extract_features_batch(all_symbols, dtype=features_dtype)
+
+    #...the feature types...
+    n_atts = training.shape[1]
+    feature_types = MathSymbol.getFeaturePlan().types
+    att_types = np.zeros((n_atts, 1), dtype=np.int32)
+    for i in xrange(n_atts):
+        if feature_types[i] == 'D':
+            att_types[i] = 2
+        else:
+            att_types[i] = 1
 
-        #...some output....
-        if verbose and (idx == n_original_samples - 1 or idx % 10 == 0):
-            print_overwrite("...Processed " + str(idx + 1) + " of " + str(n_original_samples))
+    #...and labels
+    labels_l = [ symbol.truth for symbol in all_symbols ]
 
     #...correct labels....
     labels_l = replace_labels(labels_l)
@@ -325,7 +335,7 @@ def main():
                     extra_samples.append(new_symbol)
 
                 #...get features....
-                extra_features = get_symbol_features(extra_samples, n_atts, verbose)
+                extra_features = get_symbol_features(extra_samples, n_atts, verbose, features_dtype)
                 #...create labels....
                 extra_labels = [label] * len(extra_samples)
 
@@ -343,7 +353,7 @@ def main():
                 continue
 
             #create empty dataset ...
-            class_data = np.zeros((n_class_samples, n_atts))
+            class_data = np.zeros((n_class_samples, n_atts), dtype=scaled_training.dtype)
             #fill with samples...
             for i in xrange(n_class_samples):
                 class_data[i, :] = scaled_training[current_refs[i], :]
@@ -408,7 +418,7 @@ def main():
 
             if not count_only:
                 #...get features....
-                extra_features = get_symbol_features(extra_samples, n_atts, verbose)
+                extra_features = get_symbol_features(extra_samples, n_atts, verbose, features_dtype)
 
                 #...create labels matrix....
                 extra_labels = [label] * len(extra_samples)
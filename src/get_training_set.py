@@ -25,6 +25,8 @@ import os
 import sys
 import fnmatch
 import string
+import itertools
+import multiprocessing
 from traceInfo import *
 from mathSymbol import *
 from load_inkml import *
@@ -45,15 +47,63 @@ from load_inkml import *
 #         - Added additional error handling for files with errors
 #
 #=====================================================================
+
+#Loads the features of one inkml file (from cache if available), on a worker process 
+#the configuration of features of the main process is used. Returns the features, 
+#labels and ids, and the text of the error if the file could not be loaded (None otherwise).
+#Only errors reading the file are handled, errors extracting the features are not 
+def process_inkml_file(task):
+    config, file_path, cache_path = task
+
+    for name, value in config:
+        setattr(MathSymbol, name, value)
+
+    try:
+        if cache_path is not None:
+            cache_file = get_features_cache_file( file_path, True, cache_path )
+
+            cached = read_features_cache( cache_file )
+            if cached is not None:
+                return cached, None
+
+        symbols = load_inkml( file_path, True )
+    except Exception as e:
+        return None, type(e).__name__ + ": " + str(e)
+
+    features, labels, ids = get_symbols_features( symbols )
+
+    if cache_path is not None:
+        write_features_cache( cache_file, features, labels, ids )
+
+    return (features, labels, ids), None
  
 def main():
     #usage check
-    if len(sys.argv) != 3:
-        print("Usage: python get_training_set.py inkml_path output")
+    if len(sys.argv) < 3 or len(sys.argv) > 5:
+        print("Usage: python get_training_set.py inkml_path output [cache_path] [workers]")
         print("Where")
         print("\tinkml_path\t= Path to directory that contains the inkml files")
         print("\toutput\t\t= File name of the output file")
+        print("\tcache_path\t= Optional, path to directory used to cache the features of each file (- = no cache)")
+        print("\tworkers\t\t= Optional, number of parallel processes used to process the files")
         return
+
+    if len(sys.argv) >= 4 and sys.argv[3] != '-':
+        cache_path = sys.argv[3]
+    else:
+        cache_path = None
+
+    if len(sys.argv) >= 5:
+        try:
+            workers = int(sys.argv[4])
+            if workers < 1:
+                print("Invalid number of workers")
+                return
+        except:
+            print("Invalid number of workers")
+            return
+    else:
+        workers = 1
     
     #load and filter the list of files, the result is a list of inkml files only
     try:
@@ -72,34 +122,57 @@ def main():
     error_files = []
     
     #read every file in the path specified...        
-    for i in range(len(filtered_list)):
-        file_name = filtered_list[i]
-        file_path = sys.argv[1] + '//' + file_name;
-        advance = float(i) / len(filtered_list)
-        print(("Processing => {:.2%} => "  + file_path).format( advance ))
-
-        try:
-            symbols = load_inkml( file_path, True )            
-        except:
-            print("Failed processing: " + file_path)
-            error_files.append(file_path)
-            symbols = []
-            
-        for new_symbol in symbols:
-            #now generate the features and add them to the list, including the tag
-            #for the expected class....
-            sample = new_symbol.getFeatures() + [ new_symbol.truth ]        
-            samples.append( sample )
-
-            #count samples per class
-            if not new_symbol.truth in labels_found:
-                labels_found[ new_symbol.truth ] = 1
-            else:
-                labels_found[ new_symbol.truth ] += 1
+    file_paths = [ sys.argv[1] + '//' + file_name for file_name in filtered_list ]
+    tasks = [ (MathSymbol.getFeaturesConfig(), file_path, cache_path) for file_path in file_paths ]
+
+    #files can be distributed between worker processes, but results
+    #are always collected in the same order of the serial run
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap(process_inkml_file, tasks)
+    else:
+        pool = None
+        results = itertools.imap(process_inkml_file, tasks)
 
-            #the source of current symbol will be
-            #exported as auxiliary file
-            sources.append( ( file_path, new_symbol.id) )
+    try:
+        for i, (result, error) in enumerate(results):
+            file_path = file_paths[i]
+            advance = float(i) / len(filtered_list)
+            print(("Processing => {:.2%} => "  + file_path).format( advance ))
+
+            if result is None:
+                print("Failed processing: " + file_path)
+                print("\t" + error)
+                error_files.append(file_path)
+                continue
+
+            features, labels, ids = result
+
+            for idx, truth in enumerate(labels):
+                #now add the features to the list, including the tag
+                #for the expected class....
+                sample = features[idx].tolist() + [ truth ]
+                samples.append( sample )
+
+                #count samples per class
+                if not truth in labels_found:
+                    labels_found[ truth ] = 1
+                else:
+                    labels_found[ truth ] += 1
+
+                #the source of current symbol will be
+                #exported as auxiliary file
+                sources.append( ( file_path, ids[idx]) )
+
+        if pool is not None:
+            pool.close()
+    except:
+        if pool is not None:
+            pool.terminate()
+        raise
+    finally:
+        if pool is not None:
+            pool.join()
 
 
     print("Total input files: " + str(len(filtered_list)))
@@ -125,7 +198,7 @@ def main():
     
     content = ''
     #print as headers the types for each feature...
-    feature_types = new_symbol.getFeaturesTypes()
+    feature_types = MathSymbol.getFeaturePlan().types
     for i, feat_type in enumerate(feature_types):
         if i > 0:
             content += '; '
@@ -138,15 +211,7 @@ def main():
             if i > 0:
                 line += '; '
             
-            if v.__class__.__name__ == "list":
-                #multiple values...
-                for j, sv in enumerate(v):
-                    if j > 0:
-                        line += '; '
-                    line += str(sv)
-            else:
-                #single value...
-                line += str(v)
+            line += str(v)
                 
         line += '\r\n'                     
         content += line
@@ -1,3 +1,6 @@
+import os
+import hashlib
+import pickle
 from traceInfo import *
 from mathSymbol import *
 import xml.etree.ElementTree as ET
@@ -34,6 +37,50 @@ debug_normalization = False
 #the current XML namespace prefix...
 INKML_NAMESPACE = '{http://www.w3.org/2003/InkML}'
 
+#version of the features stored in the cache (change it when the 
+#pre-processing or the extraction of features change)
+FEATURES_CACHE_VERSION = 2
+
+#writes the trace after each stage of pre processing (when debugging)
+def debug_trace_stage(stage, trace):
+    if stage == "duplicates" and debug_raw:
+        #output raw data
+        prefix = 'out_raw_'
+    elif stage == "missing_points" and debug_added:
+        #output data after adding points
+        prefix = 'out_added_'
+    elif stage == "final_duplicates" and debug_smoothing:
+        #output data after smoothing
+        prefix = 'out_smoothed_'
+    else:
+        return
+
+    file = open(prefix + str(trace.id) + '.txt', 'w')
+    file.write( str(trace) )
+    file.close()
+
+#parses the points of a trace element and creates the trace with general pre processing
+def load_trace_element(trace):
+    #text contains all points as string, parse them and put them
+    #into a list of tuples...
+    points_s = trace.text.split(",");
+    points_f = []
+    for p_s in points_s:
+        #split again...
+        coords_s = p_s.split()
+        #add...
+        points_f.append( (float(coords_s[0]), float(coords_s[1])) )
+
+    trace_id = int(trace.attrib['id'])
+    
+    #now create the element, and apply general trace pre processing...
+    if debug_raw or debug_added or debug_smoothing:
+        object_trace = preprocess_trace(trace_id, points_f, debug_trace_stage)
+    else:
+        object_trace = preprocess_trace(trace_id, points_f)
+
+    return trace_id, object_trace
+
 def load_inkml_traces(file_name):
     #first load the tree...
     tree = ET.parse(file_name)
@@ -42,61 +89,63 @@ def load_inkml_traces(file_name):
     #extract all the traces first...
     traces_objects = {}    
     for trace in root.findall(INKML_NAMESPACE + 'trace'):
-        #text contains all points as string, parse them and put them
-        #into a list of tuples...
-        points_s = trace.text.split(",");
-        points_f = []
-        for p_s in points_s:
-            #split again...
-            coords_s = p_s.split()
-            #add...
-            points_f.append( (float(coords_s[0]), float(coords_s[1])) )
-    
-        trace_id = int(trace.attrib['id'])
-        
-        #now create the element
-        object_trace = TraceInfo(trace_id, points_f )
+        trace_id, object_trace = load_trace_element(trace)
         
         #add to the diccionary...
         traces_objects[trace_id] = object_trace
+    
+    return root, traces_objects
+
+#creates the normalized symbol of a trace group (None if the symbol is not valid)
+def extract_group_symbol( group, traces_objects, truth_available ):
+    if truth_available:
+        #search for class label...
+        symbol_class = group.find(INKML_NAMESPACE + 'annotation').text
+
+        #search for id attribute...
+        symbol_id = 0
+        for id_att_name in group.attrib:
+            if id_att_name[-2:] == "id":
+                try:
+                    symbol_id = int(group.attrib[id_att_name])
+                except:
+                    #could not convert to int, try spliting...
+                    symbol_id = int( group.attrib[id_att_name].split(":")[0] )
+                    
+    else:
+        #unknown
+        symbol_class = '{Unknown}'
+        symbol_id = 0
+
+    #link with corresponding traces...
+    group_traces = group.findall(INKML_NAMESPACE + 'traceView')
+    symbol_list = []
+    for trace in group_traces:
+        object_trace = traces_objects[int(trace.attrib["traceDataRef"])]
+        symbol_list.append(object_trace)
         
-        #apply general trace pre processing...
-        
-        #1) first step of pre processing: Remove duplicated points        
-        object_trace.removeDuplicatedPoints()
+    #create the math symbol...
+    try:
+        new_symbol = MathSymbol(symbol_id, symbol_list, symbol_class)
+    except Exception as e:
+        print("Failed to load symbol!!")
+        print(e)
+        #skip this symbol...
+        return None
 
-        if debug_raw:
-            #output raw data
-            file = open('out_raw_' + trace.attrib['id'] + '.txt', 'w')
-            file.write( str(object_trace) )        
-            file.close()        
-            
-        #Add points to the trace...
-        object_trace.addMissingPoints()
-
-        if debug_added:
-            #output raw data
-            file = open('out_added_' + trace.attrib["id"] + '.txt', 'w')
-            file.write( str(object_trace) )        
-            file.close()
-                        
-        #Apply smoothing to the trace...
-        object_trace.applySmoothing()
-
-        #it should not ... but .....
-        if object_trace.hasDuplicatedPoints():
-            #...remove them! ....
-            object_trace.removeDuplicatedPoints()
-            
-        if debug_smoothing:
-            #output data after smoothing
-            file = open('out_smoothed_' + trace.attrib["id"] + '.txt', 'w')
+    #now normalize size and locations for traces in current symbol
+    new_symbol.normalize()
+    
+    if debug_normalization:
+        #output data after relocated
+        for trace in group_traces:
+            object_trace = traces_objects[int(trace.attrib["traceDataRef"])]
+        
+            file = open('out_reloc_' + trace.attrib["traceDataRef"] + '.txt', 'w')
             file.write( str(object_trace) )        
             file.close()
-        
-        
-    
-    return root, traces_objects
+
+    return new_symbol
 
 def extract_symbols( root, traces_objects, truth_available ):
     #put all the traces together with their corresponding symbols...
@@ -109,38 +158,8 @@ def extract_symbols( root, traces_objects, truth_available ):
     avg_height = 0.0
     
     for group in trace_groups:        
-        if truth_available:
-            #search for class label...
-            symbol_class = group.find(INKML_NAMESPACE + 'annotation').text
-
-            #search for id attribute...
-            symbol_id = 0
-            for id_att_name in group.attrib:
-                if id_att_name[-2:] == "id":
-                    try:
-                        symbol_id = int(group.attrib[id_att_name])
-                    except:
-                        #could not convert to int, try spliting...
-                        symbol_id = int( group.attrib[id_att_name].split(":")[0] )
-                        
-        else:
-            #unknown
-            symbol_class = '{Unknown}'
-            symbol_id = 0
-    
-        #link with corresponding traces...
-        group_traces = group.findall(INKML_NAMESPACE + 'traceView')
-        symbol_list = []
-        for trace in group_traces:
-            object_trace = traces_objects[int(trace.attrib["traceDataRef"])]
-            symbol_list.append(object_trace)
-            
-        #create the math symbol...
-        try:
-            new_symbol = MathSymbol(symbol_id, symbol_list, symbol_class)
-        except Exception as e:
-            print("Failed to load symbol!!")
-            print(e)
+        new_symbol = extract_group_symbol(group, traces_objects, truth_available)
+        if new_symbol is None:
             #skip this symbol...
             continue
 
@@ -149,18 +168,6 @@ def extract_symbols( root, traces_objects, truth_available ):
         #...add...
         avg_width  += (symMaxX - symMinX)
         avg_height += (symMaxY - symMinY)
-        
-        #now normalize size and locations for traces in current symbol
-        new_symbol.normalize()
-        
-        if debug_normalization:
-            #output data after relocated
-            for trace in group_traces:
-                object_trace = traces_objects[int(trace.attrib["traceDataRef"])]
-            
-                file = open('out_reloc_' + trace.attrib["traceDataRef"] + '.txt', 'w')
-                file.write( str(object_trace) )        
-                file.close()
                 
         symbols.append(new_symbol)
 
@@ -181,6 +188,74 @@ def load_inkml(file_name, truth_available):
     
     return symbols
 
+#Reads the symbols of an inkml file one at a time using incremental parsing,
+#yielding (file name, symbol id, normalized symbol). Elements already processed
+#are discarded. The size ratio of a symbol requires the average size of all the
+#symbols of the file, so if set_size_ratio is True (by default, if size ratio 
+#is used as feature) the symbols of the file are kept until the end of the file 
+#to set it (second pass), otherwise each symbol is yielded as soon as it is read.
+def iterate_inkml(file_name, truth_available, set_size_ratio=None):
+    if set_size_ratio is None:
+        set_size_ratio = MathSymbol.useSizeRatio
+
+    traces_objects = {}
+    pending = []
+    n_groups = 0
+    avg_width = 0.0
+    avg_height = 0.0
+
+    #tags of the current element and its ancestors...
+    path = []
+    top_groups = 0
+    for event, element in ET.iterparse(file_name, events=('start', 'end')):
+        if event == 'start':
+            path.append(element.tag)
+            if len(path) == 2 and element.tag == INKML_NAMESPACE + 'traceGroup':
+                top_groups += 1
+
+            continue
+
+        path.pop()
+
+        if element.tag == INKML_NAMESPACE + 'trace':
+            trace_id, object_trace = load_trace_element(element)
+            traces_objects[trace_id] = object_trace
+
+            element.clear()
+        elif (element.tag == INKML_NAMESPACE + 'traceGroup' and len(path) == 2 and
+              path[1] == INKML_NAMESPACE + 'traceGroup' and top_groups == 1):
+            #symbols are the groups inside the first group of the file...
+            n_groups += 1
+
+            new_symbol = extract_group_symbol(element, traces_objects, truth_available)
+            element.clear()
+
+            if new_symbol is None:
+                #skip this symbol...
+                continue
+
+            #capture statistics of relative size....
+            symMinX, symMaxX, symMinY, symMaxY = new_symbol.original_box
+            avg_width  += (symMaxX - symMinX)
+            avg_height += (symMaxY - symMinY)
+
+            if set_size_ratio:
+                pending.append(new_symbol)
+            else:
+                yield (file_name, new_symbol.id, new_symbol)
+
+    #second pass, for the size ratio
+    if set_size_ratio:
+        if n_groups > 0:
+            avg_width /= n_groups
+            avg_height /= n_groups
+
+            for s in pending:
+                s.setSizeRatio(avg_width, avg_height)
+
+        for s in pending:
+            yield (file_name, s.id, s)
+
 def extract_junk_symbol(traces_objects, junk_class_name):
     symbol_id = 0
     symbol_class = junk_class_name
@@ -209,3 +284,94 @@ def load_junk_inkml(file_name, junk_class_name):
     symbols = [extract_junk_symbol(traces_objects, junk_class_name)]
 
     return symbols
+
+#Fingerprint of the current configuration of features
+def get_features_fingerprint():
+    config = (FEATURES_CACHE_VERSION, MathSymbol.getFeaturesConfig())
+
+    return hashlib.sha1(repr(config)).hexdigest()
+
+#Path of the file that caches the features of an inkml file, it depends on the file 
+#contents, truth_available and the current configuration of features
+def get_features_cache_file(file_name, truth_available, cache_path):
+    #the key of the file....
+    file = open(file_name, 'rb')
+    content = file.read()
+    file.close()
+
+    #(labels and ids depend on truth_available)
+    key = hashlib.sha1(content + str(truth_available) + get_features_fingerprint()).hexdigest()
+
+    return os.path.join(cache_path, key + '.features')
+
+#Reads the features, labels and ids stored in a cache file (None if not available)
+def read_features_cache(cache_file):
+    if not os.path.exists(cache_file):
+        return None
+
+    try:
+        file = open(cache_file, 'rb')
+        try:
+            features = pickle.load(file)
+            labels = pickle.load(file)
+            ids = pickle.load(file)
+        finally:
+            file.close()
+
+        return features, labels, ids
+    except (EOFError, pickle.UnpicklingError, ValueError, KeyError, IndexError, IOError) as e:
+        #invalid cache file (truncated or corrupted), it will be created again
+        print("Invalid cache file <" + cache_file + ">")
+        print("\t" + type(e).__name__ + ": " + str(e))
+        return None
+
+#Stores the features, labels and ids in a cache file
+def write_features_cache(cache_file, features, labels, ids):
+    cache_path = os.path.dirname(cache_file)
+    if not os.path.isdir(cache_path):
+        try:
+            os.makedirs(cache_path)
+        except OSError:
+            #(might have been created by other process)
+            if not os.path.isdir(cache_path):
+                raise
+
+    #write to temporal file first, then move (never leaves a partial cache file)
+    tempo_file = cache_file + '.' + str(os.getpid()) + '.tmp'
+    file = open(tempo_file, 'wb')
+    pickle.dump(features, file, pickle.HIGHEST_PROTOCOL)
+    pickle.dump(labels, file, pickle.HIGHEST_PROTOCOL)
+    pickle.dump(ids, file, pickle.HIGHEST_PROTOCOL)
+    file.close()
+
+    os.rename(tempo_file, cache_file)
+
+#Gets the matrix of features (one row per symbol), the labels and the ids of a list of symbols
+def get_symbols_features(symbols):
+    features = extract_features_batch(symbols)
+    labels = [ symbol.truth for symbol in symbols ]
+    ids = [ symbol.id for symbol in symbols ]
+
+    return features, labels, ids
+
+#Loads the symbols of an inkml file and gets their features. Returns the
+#matrix of features (one row per symbol), the labels and the ids of the symbols. 
+#If a cache path is given, the results are stored there for the file contents,
+#truth_available and the current configuration of features, and they are re-used 
+#while all of them remain the same 
+def load_inkml_features(file_name, truth_available, cache_path=None):
+    if cache_path is not None:
+        cache_file = get_features_cache_file(file_name, truth_available, cache_path)
+
+        cached = read_features_cache(cache_file)
+        if cached is not None:
+            return cached
+
+    symbols = load_inkml(file_name, truth_available)
+
+    features, labels, ids = get_symbols_features(symbols)
+
+    if cache_path is not None:
+        write_features_cache(cache_file, features, labels, ids)
+
+    return features, labels, ids
@@ -0,0 +1,156 @@
+"""
+    DPRL Math Symbol Recognizers 
+    Copyright (c) 2012-2014 Kenny Davila, Richard Zanibbi
+
+    This file is part of DPRL Math Symbol Recognizers.
+
+    DPRL Math Symbol Recognizers is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    DPRL Math Symbol Recognizers is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with DPRL Math Symbol Recognizers.  If not, see <http://www.gnu.org/licenses/>.
+
+    Contact:
+        - Kenny Davila: kxd7282@rit.edu
+        - Richard Zanibbi: rlaz@cs.rit.edu 
+"""
+import os
+import sys
+import fnmatch
+from traceInfo import *
+from mathSymbol import *
+from load_inkml import *
+
+#=====================================================================
+#  Measures the cost of each family of features of the symbols found
+#  in a directory of inkml files, and prints it next to the number of
+#  features that each family contributes
+#
+#=====================================================================
+
+#families that can be enabled with the all_families option
+ProfiledFamilies = ['useCrossings', 'useAngularCrossings', 'useTracesNumber', 'useDistancesGrid',
+                    'useLineFeatures', 'useCDF', 'use2DHistogram', 'useGabor', 'useAspectRatio',
+                    'usePointAngDist', 'useSubsegments', 'useEigenFeatures', 'useSizeRatio']
+
+def print_cost_table(plan, n_symbols):
+    total_time = 0.0
+    for family, size in plan.getFamilies():
+        total_time += features_times.get(family, 0.0)
+
+    print("")
+    print("{:<28} {:>6} {:>8} {:>10} {:>11} {:>11} {:>7}".format("Family", "Dims", "Calls", "Total (s)",
+                                                               "ms/symbol", "us/dim/sym", "% Time"))
+    for family, size in plan.getFamilies():
+        family_time = features_times.get(family, 0.0)
+        calls = features_calls.get(family, 0)
+
+        if calls > 0:
+            per_symbol = (family_time * 1000.0) / calls
+            per_dim = (family_time * 1000000.0) / (calls * size)
+        else:
+            per_symbol = 0.0
+            per_dim = 0.0
+
+        if total_time > 0.0:
+            percent = (family_time * 100.0) / total_time
+        else:
+            percent = 0.0
+
+        print("{:<28} {:>6} {:>8} {:>10.3f} {:>11.4f} {:>11.3f} {:>7.2f}".format(family, size, calls, family_time,
+                                                                              per_symbol, per_dim, percent))
+
+    print("{:<28} {:>6} {:>8} {:>10.3f} {:>11.4f}".format("Total", plan.size, n_symbols, total_time,
+                                                          (total_time * 1000.0) / max(n_symbols, 1)))
+
+def main():
+    #usage check
+    if len(sys.argv) < 2 or len(sys.argv) > 4:
+        print("Usage: python profile_features.py inkml_path [all_families] [max_files]")
+        print("Where")
+        print("\tinkml_path\t= Path to directory that contains the inkml files")
+        print("\tall_families\t= Optional, use all families of features instead of the current ones (1 = yes, 0 = no)")
+        print("\tmax_files\t= Optional, maximum number of files to process")
+        return
+
+    try:
+        if len(sys.argv) >= 3:
+            all_families = int(sys.argv[2]) > 0
+        else:
+            all_families = False
+
+        if len(sys.argv) >= 4:
+            max_files = int(sys.argv[3])
+        else:
+            max_files = None
+    except:
+        print("Invalid parameters")
+        return
+
+    #load and filter the list of files, the result is a list of inkml files only
+    try:
+        filtered_list = sorted(fnmatch.filter(os.listdir(sys.argv[1]), '*.inkml'))
+    except:
+        print( "The inkml path <" + sys.argv[1] + "> is invalid!" )
+        return
+
+    if max_files is not None:
+        filtered_list = filtered_list[:max_files]
+
+    if all_families:
+        for family in ProfiledFamilies:
+            setattr(MathSymbol, family, True)
+
+    MathSymbol.profileFeatures = True
+    reset_features_times()
+    reset_preprocessing_times()
+
+    plan = MathSymbol.getFeaturePlan()
+
+    n_symbols = 0
+    load_time = 0.0
+    for i, file_name in enumerate(filtered_list):
+        file_path = os.path.join(sys.argv[1], file_name)
+        advance = float(i) / len(filtered_list)
+        print(("Processing => {:.2%} => "  + file_path).format( advance ))
+
+        #the symbols of the file are loaded first, so a file that can't be 
+        #loaded does not add anything to the times and counts...
+        loaded_times = dict(preprocessing_times)
+        try:
+            start = time.time()
+            symbols = [ symbol for symbol_path, symbol_id, symbol in iterate_inkml( file_path, True ) ]
+            end = time.time()
+        except (IOError, SyntaxError, ET.ParseError, KeyError, ValueError, IndexError) as e:
+            print("Failed processing: " + file_path)
+            print(e)
+
+            preprocessing_times.update(loaded_times)
+            continue
+
+        load_time += end - start
+
+        #...errors extracting the features are not handled
+        for symbol in symbols:
+            plan.extract(symbol)
+
+        n_symbols += len(symbols)
+
+    print("")
+    print("Total files: " + str(len(filtered_list)))
+    print("Total symbols: " + str(n_symbols))
+    print("Total traces: " + str(preprocessing_times["traces"]))
+    print("Loading time (s): {:.3f}".format(load_time))
+    for stage in PreprocessingStages:
+        print("\t- Pre-processing " + stage + " (s): {:.3f}".format(preprocessing_times[stage]))
+
+    print_cost_table(plan, n_symbols)
+
+main()
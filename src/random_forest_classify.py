@@ -67,7 +67,7 @@ def main():
     #usage check
     if len(sys.argv) < 8:
         print("Usage: python random_forest_classify.py training_set testing_set N_trees max_D ")
-        print("       max_feats type times [n_jobs] [out_file]")
+        print("       max_feats type times [n_jobs] [out_file] [single_precision]")
         print("Where")
         print("\ttraining_set\t= Path to the file of the training set")
         print("\ttesting_set\t= Path to the file of the testing set")
@@ -80,12 +80,27 @@ def main():
         print("\ttimes\t\t= Number of times to repeat experiments")
         print ("\tn_jobs\t\t= Optional, number of parallel threads to use")
         print ("\tout_file\t= Optional, file where classifier will be stored")
+        print ("\tsingle_precision\t= Optional, load data and classify in single precision (float32)")
         return
 
+    if len(sys.argv) >= 11:
+        try:
+            single_precision = int(sys.argv[10]) > 0
+        except:
+            print("Invalid single_precision value")
+            return
+    else:
+        single_precision = False
+
+    if single_precision:
+        data_dtype = np.float32
+    else:
+        data_dtype = np.float64
+
     print("Loading data....")
     #...load training data from file...
     train_filename = sys.argv[1]
-    training, labels_l, att_types = load_dataset(train_filename)
+    training, labels_l, att_types = load_dataset(train_filename, data_dtype)
     #...generate mapping...
     classes_dict, classes_l = get_label_mapping(labels_l)
     n_classes = len(classes_l)
@@ -94,7 +109,7 @@ def main():
 
     #...load testing data from file...
     test_filename = sys.argv[2]
-    testing, test_labels_l, att_types = load_dataset(test_filename)
+    testing, test_labels_l, att_types = load_dataset(test_filename, data_dtype)
     #...generate mapped labels...
     labels_test = get_mapped_labels(test_labels_l, classes_dict)
 
@@ -250,7 +265,8 @@ def main():
           str(round(all_testing_stds.std(), 3)))
 
     #...Save to file...
-    classifier = SymbolClassifier(SymbolClassifier.TypeRandomForest, best_forest_ref, classes_l, classes_dict)
+    classifier = SymbolClassifier(SymbolClassifier.TypeRandomForest, best_forest_ref, classes_l, classes_dict,
+                                  dtype=data_dtype)
 
     out_file = open(out_filename, 'wb')
     cPickle.dump(classifier, out_file, cPickle.HIGHEST_PROTOCOL)
@@ -22,7 +22,7 @@
         - Richard Zanibbi: rlaz@cs.rit.edu
 """
 import numpy as np
-from traceInfo import TraceInfo
+from traceInfo import TraceInfo, preprocess_trace
 from mathSymbol import MathSymbol
 
 class SymbolClassifier:
@@ -30,13 +30,19 @@ class SymbolClassifier:
     TypeSVMLIN = 2
     TypeSVMRBF = 3
 
-    def __init__(self, type, trained_classifier, classes_list, classes_dict, scaler=None, probabilistic=False):
+    def __init__(self, type, trained_classifier, classes_list, classes_dict, scaler=None, probabilistic=False,
+                 dtype=np.float64):
         self.type = type
         self.trained_classifier = trained_classifier
         self.classes_list = classes_list
         self.classes_dict = classes_dict
         self.scaler = scaler
         self.probabilistic = probabilistic
+        # precision of the features given to the model (the one used for training)
+        self.dtype = dtype
+
+        # indices of the features that the trained model actually uses (None = all)
+        self.used_features = self.find_used_features()
 
     def predict(self, dataset):
         return self.trained_classifier.predict(dataset)
@@ -47,28 +53,39 @@ class SymbolClassifier:
     def get_raw_classes(self):
         return self.trained_classifier.classes_
 
-    def get_symbol_from_points(self, points_lists):
+    def find_used_features(self):
+        if self.type == SymbolClassifier.TypeRandomForest and hasattr(self.trained_classifier, "estimators_"):
+            # features used on the splits of any of the trees (leaves are negative)
+            used = set()
+            for estimator in self.trained_classifier.estimators_:
+                used.update(estimator.tree_.feature[estimator.tree_.feature >= 0].tolist())
 
-        traces = []
-        for trace_id, point_list in enumerate(points_lists):
-            object_trace = TraceInfo(trace_id, point_list)
+            return np.array(sorted(used), dtype=np.int64)
 
-            traces.append(object_trace)
+        if self.type == SymbolClassifier.TypeSVMLIN and hasattr(self.trained_classifier, "coef_"):
+            # features with non-zero weight for any of the classes
+            coef = self.trained_classifier.coef_
+            if hasattr(coef, "toarray"):
+                coef = coef.toarray()
 
-            # apply general trace pre processing...
-            # 1) first step of pre processing: Remove duplicated points
-            object_trace.removeDuplicatedPoints()
+            return np.nonzero(np.any(coef != 0.0, axis=0))[0]
 
-            # Add points to the trace...
-            object_trace.addMissingPoints()
+        # any other model might use all the features
+        return None
 
-            # Apply smoothing to the trace...
-            object_trace.applySmoothing()
+    def get_used_features(self):
+        # (classifiers saved before this information was added)
+        if not hasattr(self, "used_features"):
+            self.used_features = self.find_used_features()
 
-            # it should not ... but .....
-            if object_trace.hasDuplicatedPoints():
-                # ...remove them! ....
-                object_trace.removeDuplicatedPoints()
+        return self.used_features
+
+    def get_symbol_from_points(self, points_lists):
+
+        traces = []
+        for trace_id, point_list in enumerate(points_lists):
+            # create the trace and apply general trace pre processing...
+            traces.append(preprocess_trace(trace_id, point_list))
 
         new_symbol = MathSymbol(0, traces, '{Unknown}')
 
@@ -78,11 +95,18 @@ class SymbolClassifier:
         return new_symbol
 
     def get_symbol_features(self, symbol):
-        # get raw features
-        features = symbol.getFeatures()
+        # get raw features (as a row of a matrix)
+        plan = MathSymbol.getFeaturePlan()
+
+        used_features = self.get_used_features()
+        if used_features is None:
+            features = plan.extract(symbol)
+        else:
+            # only the families that produce features used by the model, the rest remain as 0.0
+            features = plan.extract(symbol, extractors=plan.getRequiredExtractors(used_features))
 
-        # put them in python format
-        mat_features = np.mat(features, dtype=np.float64)
+        # (classifiers saved before the precision was added use double)
+        mat_features = np.mat(features, dtype=getattr(self, "dtype", np.float64))
 
         # automatically transform features
         if self.scaler is not None:
@@ -128,3 +152,54 @@ class SymbolClassifier:
         return confidences
 
 
+class IncrementalSymbolRecognizer:
+    # Recognizes a symbol while its strokes are being added. The pre-processed
+    # version of each stroke is kept, so only new strokes are pre-processed
+    # again, while normalization and features are computed for the whole symbol
+    def __init__(self, classifier):
+        self.classifier = classifier
+        self.points_lists = []
+        self.traces = []
+
+    def reset(self):
+        self.points_lists = []
+        self.traces = []
+
+    def add_stroke(self, point_list):
+        # create the trace and apply general trace pre processing...
+        self.traces.append(preprocess_trace(len(self.traces), point_list))
+        self.points_lists.append(list(point_list))
+
+    def set_strokes(self, points_lists):
+        # keep the strokes that did not change (from the start)
+        n_kept = 0
+        while (n_kept < len(self.points_lists) and n_kept < len(points_lists) and
+               self.points_lists[n_kept] == list(points_lists[n_kept])):
+            n_kept += 1
+
+        self.points_lists = self.points_lists[:n_kept]
+        self.traces = self.traces[:n_kept]
+
+        # ... and process the new ones
+        for point_list in points_lists[n_kept:]:
+            self.add_stroke(point_list)
+
+    def get_symbol(self):
+        # normalize copies of the traces (the pre-processed ones are kept as they are)
+        new_symbol = MathSymbol(0, [trace.clone() for trace in self.traces], '{Unknown}')
+
+        # normalize size and locations
+        new_symbol.normalize()
+
+        return new_symbol
+
+    def classify(self):
+        return self.classifier.classify_symbol(self.get_symbol())
+
+    def classify_prob(self, top_n=None):
+        return self.classifier.classify_symbol_prob(self.get_symbol(), top_n)
+
+    def classify_points_prob(self, points_lists, top_n=None):
+        self.set_strokes(points_lists)
+
+        return self.classify_prob(top_n)